@@ -1,5 +1,23 @@
 """Shoppy Agent CLI: Find products you love."""
-import cli.app as app
+import sys
 
 if __name__ == "__main__":
-    app.main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import cli.serve as serve
+
+        serve.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import cli.batch as batch
+
+        batch.main(sys.argv[2:])
+    else:
+        import argparse
+        import cli.app as app
+
+        parser = argparse.ArgumentParser(prog="cli", description=__doc__)
+        parser.add_argument("--startup-timing", action="store_true", help="Report where the launch time goes and exit.")
+        parser.add_argument("--view", choices=["table", "json"], default="table", help="How products are shown.")
+        parser.add_argument("--json-output", metavar="PATH", help="Append the products as JSON lines to PATH instead.")
+        args = parser.parse_args(sys.argv[1:])
+
+        app.main(startup_timing=args.startup_timing, view=args.view, json_path=args.json_output)
@@ -1,49 +1,98 @@
-import sys, os, json
+import sys, os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from openai import OpenAI
+from .render import Renderer
+from .startup import StartupTimer
 from .utils import announce, prompt_string, prompt_confirm
-from src import Agent
 
 
-def main():
+def main(startup_timing: bool = False, view: str = "table", json_path: str = None):
+    timer = StartupTimer(enabled=startup_timing or bool(os.getenv("SHOPPY_STARTUP_TIMING")))
     api_key = os.getenv("OPENAI_API_KEY")
 
     if not api_key:
         announce("No OpenAI API key found. Please set the OPENAI_API_KEY environment variable.", prefix="❌ ")
         sys.exit(1)
 
-    client = OpenAI(api_key=api_key)
-    
-    def on_product_list(products: list[dict]):
-        announce("Results:", prefix="📦 ")
-        for product in products:
-            print(json.dumps(product, indent=4))
-            
-    def on_text_changed(text: str):
-        print(text, end="", flush=True)
-    
-    agent = Agent(client, on_product_list=on_product_list, on_text_changed=on_text_changed)
+    # The streaming callbacks only queue their output; a background thread writes it to the terminal
+    renderer = Renderer(view=view, json_path=json_path)
+
+    def prepare():
+        # Runs while the user types the first query: the heavy imports, then the thread creation
+        with timer.phase("import openai"):
+            from openai import OpenAI
+        with timer.phase("import agent"):
+            from src.agent import Agent
+            from src.utils import WARNING, log
+        with timer.phase("create agent"):
+            agent = Agent(
+                OpenAI(api_key=api_key),
+                on_product_list=renderer.on_product_list,
+                on_text_changed=renderer.on_text_changed,
+            )
+        with timer.phase("create thread"):
+            try:
+                agent.prepare()
+            except Exception as error:
+                # Not fatal: the first search creates the thread instead
+                log(lambda: f"Could not create the thread ahead of the first search: {error!r}", level=WARNING)
+        return agent
+
+    warmup = ThreadPoolExecutor(1, thread_name_prefix="shoppy-warmup").submit(prepare)
 
     announce("Welcome to the Shoppy CLI app", prefix="👋 ")
-    
+
+    if startup_timing:
+        # Measure the launch alone: wait for the agent instead of the first query
+        with timer.phase("import prompt"):
+            from InquirerPy import prompt  # noqa: F401
+        timer.mark("first prompt ready")
+        with timer.phase("wait for agent"):
+            warmup.result()
+        announce(f"Startup timing:\n{timer.report()}", prefix="⏱️ ")
+        sys.exit(0)
+
+    agent = None
+    timer.mark("first prompt shown")
     while True:
         query = prompt_string("What are you looking for?")
         announce(f"Searching for {query}...", prefix="🔍 ")
-        
+
         # Start timer
         start_time = datetime.now()
-        
-        # Search
-        agent.search(query)
-        
+
+        if agent is None:
+            with timer.phase("wait for agent"):
+                agent = warmup.result()
+            if timer.enabled:
+                announce(f"Startup timing:\n{timer.report()}", prefix="⏱️ ")
+                timer.enabled = False
+
+        # Loaded along with the agent
+        from src.error import MaxRoundsExceededError
+
+        # Search; Ctrl-C cancels the search instead of quitting
+        try:
+            agent.search(query)
+        except KeyboardInterrupt:
+            renderer.flush()
+            announce("\nSearch cancelled.", prefix="🛑 ")
+        except MaxRoundsExceededError as error:
+            renderer.flush()
+            announce(f"\n{error.message} Try a more specific query.", prefix="⚠️ ")
+
+        # Let the output catch up before printing directly
+        renderer.flush()
+
         # End timer
         end_timer = datetime.now()
-    
+
         announce(f"\nTotal time taken: {end_timer - start_time}\n", prefix="⏱️ ")
-        
+
         should_continue = prompt_confirm("Do you want to continue?", default=True)
-        
+
         if not should_continue:
             break
 
+    renderer.close()
     sys.exit(0)
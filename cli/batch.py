@@ -0,0 +1,193 @@
+import sys, os, json, time, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from .utils import announce
+
+
+class Writer:
+    """A class to append one JSON record per line, flushed as soon as it is written."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a+")
+        self.lock = threading.Lock()
+
+        # Terminate the line a crashed run was writing, so the next record starts on its own line
+        if self.file.tell():
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != "\n":
+                self.file.write("\n")
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def completed_ids(path: str) -> set[str]:
+    """Returns the ids already answered in the output file, so a rerun resumes where it stopped."""
+
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The line being written when the previous run died
+                continue
+            if record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+
+def read_queries(path: str, id_field: str, query_field: str):
+    """Yields the `(id, query)` of every line of the input file, without reading it all at once."""
+
+    with open(path) as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                announce(f"Skipping line {number}: not valid JSON", prefix="⚠️ ")
+                continue
+            query = record.get(query_field) if isinstance(record, dict) else record
+            if not query:
+                announce(f"Skipping line {number}: no {query_field!r}", prefix="⚠️ ")
+                continue
+            yield str(record.get(id_field, number) if isinstance(record, dict) else number), str(query)
+
+
+def run_query(client, dispatcher, args, query_id: str, query: str) -> dict:
+    """Runs one query in a fresh conversation and returns its output record."""
+
+    from src.agent import Agent
+
+    products: list[dict] = []
+    text: list[str] = []
+    started = time.perf_counter()
+    timings = {"first_text": None, "first_products": None}
+
+    def on_product_list(items: list[dict]):
+        if timings["first_products"] is None:
+            timings["first_products"] = time.perf_counter() - started
+        products.extend(items)
+
+    def on_text_changed(delta: str):
+        if timings["first_text"] is None:
+            timings["first_text"] = time.perf_counter() - started
+        text.append(delta)
+
+    agent = Agent(
+        client,
+        on_product_list=on_product_list,
+        on_text_changed=on_text_changed,
+        max_rounds=args.max_rounds,
+        dispatcher=dispatcher,
+        mode=args.mode,
+    )
+
+    record = {"id": query_id, "query": query}
+    try:
+        agent.search(query)
+        record["status"] = "ok"
+    except Exception as error:
+        record["status"] = "error"
+        record["error"] = f"{error.__class__.__name__}: {error}"
+
+    timings["total"] = time.perf_counter() - started
+    record.update(
+        thread_id=agent.thread_id,
+        text="".join(text),
+        products=products,
+        timings=timings,
+        stats=agent.runner.stats.model_dump(),
+    )
+    return record
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="cli batch", description="Run every query of a JSONL file through the agent.")
+    parser.add_argument("input", help="JSONL file with one query per line, as an object or a string.")
+    parser.add_argument("--output", help="JSONL file the results are appended to; defaults to INPUT.out.jsonl.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations running at once.")
+    parser.add_argument("--id-field", default="id", help="Field holding the query id; defaults to the line number.")
+    parser.add_argument("--query-field", default="query", help="Field holding the query text.")
+    parser.add_argument("--max-rounds", type=int, default=10, help="Tool rounds allowed per query.")
+    parser.add_argument("--mode", choices=["assistants", "chat"], help="Runner mode; defaults to SHOPPY_RUNNER.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the results of a previous run.")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        announce("No OpenAI API key found. Please set the OPENAI_API_KEY environment variable.", prefix="❌ ")
+        sys.exit(1)
+
+    from openai import OpenAI
+    from src.dispatch import Dispatcher
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}.out.jsonl"
+    if args.restart and os.path.exists(output):
+        os.remove(output)
+    done = completed_ids(output)
+    if done:
+        announce(f"Resuming: {len(done)} queries already answered in {output}", prefix="↩️ ")
+
+    # Every conversation shares one client and one dispatcher, so connections and cached responses are reused
+    client = OpenAI(api_key=api_key)
+    dispatcher = Dispatcher()
+    writer = Writer(output)
+    counts = {"ok": 0, "error": 0}
+    counts_lock = threading.Lock()
+    started = time.perf_counter()
+
+    # Bound the queries read ahead of the workers, so huge input files stream through
+    pending = threading.Semaphore(args.concurrency * 2)
+
+    def _run(query_id: str, query: str):
+        try:
+            record = run_query(client, dispatcher, args, query_id, query)
+            writer.write(record)
+            with counts_lock:
+                counts[record["status"]] += 1
+            if record["status"] == "error":
+                announce(f"{query_id}: {record['error']}", prefix="❌ ")
+        except Exception as error:
+            # Failed outside the search itself, e.g. building the agent; the executor would drop it silently
+            with counts_lock:
+                counts["error"] += 1
+            announce(f"{query_id}: {error.__class__.__name__}: {error}", prefix="❌ ")
+        finally:
+            pending.release()
+
+    announce(f"Running {args.input} with {args.concurrency} concurrent conversations...", prefix="🔍 ")
+    workers = ThreadPoolExecutor(args.concurrency, thread_name_prefix="shoppy-batch")
+    try:
+        for query_id, query in read_queries(args.input, args.id_field, args.query_field):
+            if query_id in done:
+                continue
+            pending.acquire()
+            workers.submit(_run, query_id, query)
+    except KeyboardInterrupt:
+        announce("Interrupted; finishing the queries in flight. Run again to resume.", prefix="⏸️ ")
+        workers.shutdown(cancel_futures=True)
+    finally:
+        workers.shutdown()
+        writer.close()
+        dispatcher.close()
+
+    elapsed = time.perf_counter() - started
+    total = counts["ok"] + counts["error"]
+    announce(
+        f"{counts['ok']} answered, {counts['error']} failed in {elapsed:.1f}s"
+        f" ({total / elapsed if elapsed else 0:.2f} queries/s). Results in {output}",
+        prefix="✅ ",
+    )
+    sys.exit(1 if counts["error"] else 0)
@@ -0,0 +1,169 @@
+import sys, json, time, queue, shutil, threading
+
+__all__ = ["Renderer", "VIEWS"]
+
+VIEWS = ("table", "json")
+
+CYAN = "\033[96m"
+DEFAULT = "\033[0m"
+
+
+class Renderer:
+    """A class to write the agent's output from a background thread, so slow terminals never stall the stream.
+
+    Text deltas and product lists are queued by the streaming callbacks and written at most `fps` times a
+    second, with everything queued in between coalesced into a single write. Products are shown as a
+    compact table, as indented JSON with `view="json"`, or appended as JSON lines to `json_path` instead.
+    """
+
+    def __init__(self, stream=None, view: str = "table", json_path: str = None, fps: float = 30):
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view {view!r}; expected one of {', '.join(VIEWS)}.")
+
+        self.stream = stream or sys.stdout
+        self.view = view
+        self.json_file = open(json_path, "a") if json_path else None
+        self.json_path = json_path
+        self.interval = 1 / fps
+        self._queue = queue.SimpleQueue()
+        self._last_write = 0.0
+        self._at_line_start = True
+        self._thread = threading.Thread(target=self._run, name="shoppy-render", daemon=True)
+        self._thread.start()
+
+    # MARK - Callbacks, called from the streaming thread
+
+    def on_text_changed(self, text: str) -> None:
+        self._queue.put(("text", text))
+
+    def on_product_list(self, products: list[dict]) -> None:
+        self._queue.put(("products", products))
+
+    # MARK - Control
+
+    def flush(self, timeout: float = None) -> None:
+        """Blocks until everything queued so far is written, e.g. before printing on the terminal directly."""
+
+        written = threading.Event()
+        self._queue.put(("flush", written))
+        written.wait(timeout)
+
+    def close(self) -> None:
+        """Writes everything queued, then stops the output thread."""
+
+        self._queue.put(None)
+        self._thread.join()
+        if self.json_file is not None:
+            self.json_file.close()
+
+    # MARK - Output thread
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+
+            # Wait for the next frame, collecting what arrives meanwhile
+            wait = self._last_write + self.interval - time.monotonic()
+            while wait > 0:
+                try:
+                    items.append(self._queue.get(timeout=wait))
+                except queue.Empty:
+                    break
+                wait = self._last_write + self.interval - time.monotonic()
+
+            # Then take whatever else is already queued
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = self._write(items)
+            self._last_write = time.monotonic()
+            if stop:
+                return
+
+    def _write(self, items: list) -> bool:
+        """Writes the items in one go and returns whether the renderer was closed."""
+
+        chunks: list[str] = []
+        flushed: list[threading.Event] = []
+        stop = False
+
+        for item in items:
+            if item is None:
+                stop = True
+                break
+
+            kind, value = item
+            if kind == "text":
+                chunks.append(value)
+            elif kind == "products":
+                start_line = chunks[-1].endswith("\n") if chunks else self._at_line_start
+                chunks.append(self._products(value, start_line))
+            elif kind == "flush":
+                flushed.append(value)
+
+        output = "".join(chunks)
+        if output:
+            try:
+                self.stream.write(output)
+                self.stream.flush()
+            except (BrokenPipeError, ValueError):
+                # The terminal went away; keep draining so the callers never block
+                pass
+            self._at_line_start = output.endswith("\n")
+
+        for event in flushed:
+            event.set()
+        return stop
+
+    def _products(self, products: list[dict], start_line: bool) -> str:
+        """Returns the text shown for a product list."""
+
+        prefix = "" if start_line else "\n"
+
+        if self.json_file is not None:
+            self.json_file.write("".join(json.dumps(product) + "\n" for product in products))
+            self.json_file.flush()
+            return f"{prefix}📦 {CYAN}{len(products)} products written to {self.json_path}{DEFAULT}\n"
+
+        if self.view == "json":
+            return f"{prefix}📦 {CYAN}Results:{DEFAULT}\n" + "".join(
+                json.dumps(product, indent=4) + "\n" for product in products
+            )
+
+        return f"{prefix}📦 {CYAN}Results:{DEFAULT}\n{table(products)}\n"
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+def table(products: list[dict], width: int = None) -> str:
+    """Returns the products as a compact table, one line each, fitted to the terminal width."""
+
+    width = width or shutil.get_terminal_size().columns
+    # The title takes whatever the other columns leave
+    title_width = max(20, width - 4 - 12 - 8 - 9 - 20 - 5)
+
+    lines = [f"{'#':>4} {'Title':<{title_width}} {'Price':>12} {'Rating':>8} {'Reviews':>9} {'Source':<20}"]
+    for index, product in enumerate(products, start=1):
+        # Product details carry their summary in `product_results`
+        product = product.get("product_results") or product
+        rank = product.get("rank") or product.get("position") or index
+        rating = product.get("rating")
+        reviews = product.get("reviews")
+        lines.append(
+            f"{rank:>4} {_fit(product.get('title'), title_width):<{title_width}}"
+            f" {_fit(product.get('price'), 12):>12}"
+            f" {'' if rating is None else rating:>8}"
+            f" {'' if reviews is None else reviews:>9}"
+            f" {_fit(product.get('source'), 20):<20}"
+        )
+    return "\n".join(lines)
+
+
+def _fit(value, width: int) -> str:
+    text = "" if value is None else str(value)
+    return text if len(text) <= width else text[: width - 1] + "…"
+
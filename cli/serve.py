@@ -0,0 +1,36 @@
+import sys, os, asyncio, argparse
+from openai import OpenAI
+from .utils import announce
+from src.service import AgentService, serve
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="cli serve", description="Serve the agent over HTTP/SSE.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-turns", type=int, default=16, help="Turns running at once across all sessions.")
+    parser.add_argument("--max-sessions", type=int, default=1_000, help="Sessions kept in memory.")
+    parser.add_argument("--mode", choices=["assistants", "chat"], help="Runner mode; defaults to SHOPPY_RUNNER.")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        announce("No OpenAI API key found. Please set the OPENAI_API_KEY environment variable.", prefix="❌ ")
+        sys.exit(1)
+
+    service = AgentService(
+        OpenAI(api_key=api_key),
+        max_concurrent_turns=args.max_turns,
+        max_sessions=args.max_sessions,
+        mode=args.mode,
+    )
+
+    announce(f"Serving Shoppy on http://{args.host}:{args.port}", prefix="🛍️ ")
+
+    try:
+        asyncio.run(serve(service, host=args.host, port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+    sys.exit(0)
@@ -0,0 +1,50 @@
+import time, threading
+from contextlib import contextmanager
+
+__all__ = ["StartupTimer"]
+
+
+class StartupTimer:
+    """A class to measure where the milliseconds of a CLI launch go."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: list[tuple[str, str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the enclosed phase, on whichever thread runs it."""
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, threading.current_thread().name, start, time.perf_counter()))
+
+    def mark(self, name: str) -> None:
+        """Records a point in time, such as the first prompt being shown."""
+        if self.enabled:
+            now = time.perf_counter()
+            with self._lock:
+                self.phases.append((name, threading.current_thread().name, now, now))
+
+    def report(self) -> str:
+        """Returns every phase with its start offset and duration in milliseconds."""
+
+        lines = [f"{'phase':<28}{'thread':<16}{'start ms':>10}{'took ms':>10}"]
+        for name, thread, start, end in sorted(self.phases, key=lambda p: p[2]):
+            lines.append(
+                f"{name:<28}{thread:<16}{(start - self.started) * 1000:>10.1f}{(end - start) * 1000:>10.1f}"
+            )
+        lines.append(f"{'total':<44}{(time.perf_counter() - self.started) * 1000:>20.1f}")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.__class__.__name__
@@ -1,5 +1,3 @@
-from InquirerPy import prompt
-
 __all__ = ["prompt_confirm", "prompt_string", "prompt_list", "announce", "num_tokens"]
 
 
@@ -11,6 +9,14 @@ def announce(message, prefix: str = ""):
     print("{0}{1}{2}{3}".format(prefix, cyan, message, default))
 
 
+def prompt(questions):
+    # InquirerPy loads prompt_toolkit, so import it only once a question is asked
+
+    from InquirerPy import prompt as inquirer_prompt
+
+    return inquirer_prompt(questions)
+
+
 def prompt_confirm(question_message, default=True):
     # Function to prompt a confirmation question
 
@@ -0,0 +1,208 @@
+"""End-to-end latency benchmark of Runner and Dispatcher against local fakes; needs no OpenAI or SerpAPI key.
+
+    python -m scripts.benchmark --scenario multi-round --serp-latency lognormal:1.0,0.5 --output bench.json
+"""
+import sys, json, time, argparse, statistics, tracemalloc
+from datetime import datetime, timezone
+from src.agent import Agent
+from src.backend import ReplayBackend
+from src.dispatch import Dispatcher
+from scripts.fakes import FakeOpenAI, Latency, SimulatedSerpApi
+
+DETAILS = "https://serpapi.com/search.json?engine=google_product&product_id={}"
+FILTER = "https://serpapi.com/search.json?engine=google_shopping&q={}&tbs=mr:1,price:1,ppr_max:100"
+
+
+def _call(name: str, **arguments) -> list:
+    return [name, json.dumps(arguments)]
+
+
+SCENARIOS = {
+    "single-search": [
+        {
+            "query": "wireless headphones",
+            "rounds": [
+                {"tool_calls": [_call("execute_search", query="wireless headphones")]},
+                {"text": "Here are a few wireless headphones you might like. " * 6},
+            ],
+        }
+    ],
+    "multi-round": [
+        {
+            "query": "noise cancelling headphones under 200",
+            "rounds": [
+                {
+                    "tool_calls": [
+                        _call("execute_search", query="noise cancelling headphones"),
+                        _call("execute_search", query="anc headphones under 200"),
+                        _call("execute_search", query="sony wh-1000xm4"),
+                    ]
+                },
+                {
+                    "tool_calls": [
+                        _call("get_product_details", serpapi_product_api=DETAILS.format(1)),
+                        _call("get_product_details", serpapi_product_api=DETAILS.format(2)),
+                        _call("filter_results", serpapi_link=FILTER.format("noise+cancelling+headphones")),
+                    ]
+                },
+                {"text": "The best options under $200 are listed above, with details on each. " * 8},
+            ],
+        },
+        {
+            "query": "which one has the best battery life?",
+            "rounds": [
+                {"tool_calls": [_call("get_product_details", serpapi_product_api=DETAILS.format(3))]},
+                {"text": "The second pair lasts the longest, at about 30 hours per charge. " * 4},
+            ],
+        },
+    ],
+}
+
+
+class TurnMetrics:
+    """A class to record the timings of one conversation turn."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_text: float | None = None
+        self.first_products: float | None = None
+        self.tool_rounds: list[float] = []
+
+    def on_text_changed(self, _):
+        if self.first_text is None:
+            self.first_text = time.perf_counter() - self.started
+
+    def on_product_list(self, _):
+        if self.first_products is None:
+            self.first_products = time.perf_counter() - self.started
+
+
+def run(turns: list[dict], args: argparse.Namespace) -> list[dict]:
+    """Runs the scripted conversation once and returns the metrics of each turn."""
+
+    client = FakeOpenAI(
+        turns,
+        api=Latency.parse(args.api_latency, seed=args.seed),
+        first_event=Latency.parse(args.first_event_latency, seed=args.seed),
+        delta=Latency.parse(args.delta_latency, seed=args.seed),
+    )
+
+    serp_latency = Latency.parse(args.serp_latency, seed=args.seed)
+    if args.cassettes:
+        backend = ReplayBackend(args.cassettes, latency=serp_latency)
+    else:
+        backend = SimulatedSerpApi(latency=serp_latency, error_rate=args.serp_error_rate, seed=args.seed)
+
+    dispatcher = Dispatcher(cache=args.cache, backend=backend)
+    metrics = TurnMetrics()
+    agent = Agent(
+        client,
+        on_product_list=lambda products: metrics.on_product_list(products),
+        on_text_changed=lambda text: metrics.on_text_changed(text),
+        dispatcher=dispatcher,
+        mode=args.mode,
+    )
+
+    # Time every tool round: execute the calls, then submit their outputs
+    executor = agent.runner.executor
+    execute = executor.execute
+
+    def _timed_execute(tool_calls, deadline=None):
+        started = time.perf_counter()
+        outputs = execute(tool_calls, deadline)
+        metrics.tool_rounds.append(time.perf_counter() - started)
+        return outputs
+
+    executor.execute = _timed_execute
+
+    results = []
+    for turn in turns:
+        metrics.__init__()
+        api_calls = client.api_calls
+        tracemalloc.reset_peak()
+
+        agent.search(turn["query"])
+
+        results.append(
+            {
+                "query": turn["query"],
+                "total": time.perf_counter() - metrics.started,
+                "time_to_first_text": metrics.first_text,
+                "time_to_first_products": metrics.first_products,
+                "tool_rounds": metrics.tool_rounds,
+                "api_calls": client.api_calls - api_calls,
+                "serp_requests": getattr(backend, "requests", None),
+                "peak_memory": tracemalloc.get_traced_memory()[1],
+            }
+        )
+
+    return results
+
+
+def summarize(turns: list[dict]) -> dict:
+    """Returns the percentiles of every metric across the recorded turns."""
+
+    def _stats(values: list[float]) -> dict | None:
+        values = sorted(v for v in values if v is not None)
+        if not values:
+            return None
+        return {
+            "p50": statistics.median(values),
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+            "mean": statistics.fmean(values),
+        }
+
+    return {
+        "turns": len(turns),
+        "total": _stats([t["total"] for t in turns]),
+        "time_to_first_text": _stats([t["time_to_first_text"] for t in turns]),
+        "time_to_first_products": _stats([t["time_to_first_products"] for t in turns]),
+        "tool_round": _stats([r for t in turns for r in t["tool_rounds"]]),
+        "api_calls_per_turn": _stats([t["api_calls"] for t in turns]),
+        "peak_memory": max(t["peak_memory"] for t in turns),
+    }
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="multi-round", help=f"One of {sorted(SCENARIOS)} or a JSON file of turns.")
+    parser.add_argument("--mode", choices=["assistants", "chat"], default="assistants", help="Runner mode to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Times to replay the whole conversation.")
+    parser.add_argument("--serp-latency", default="lognormal:1.0,0.5", help="fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--serp-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-latency", default="fixed:0.15", help="Latency of non-streaming OpenAI calls.")
+    parser.add_argument("--first-event-latency", default="lognormal:0.6,0.3", help="Latency before each stream's first event.")
+    parser.add_argument("--delta-latency", default="fixed:0.01", help="Latency between text deltas.")
+    parser.add_argument("--cassettes", help="Replay recorded SerpAPI cassettes instead of simulated responses.")
+    parser.add_argument("--cache", action="store_true", help="Enable the in-memory response cache.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args(argv)
+
+    if args.scenario in SCENARIOS:
+        turns = SCENARIOS[args.scenario]
+    else:
+        with open(args.scenario) as file:
+            turns = json.load(file)
+
+    tracemalloc.start()
+    runs = [run(turns, args) for _ in range(args.repeat)]
+    tracemalloc.stop()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "summary": summarize([turn for r in runs for turn in r]),
+        "runs": runs,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(json.dumps(report["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,28 +1,62 @@
-import subprocess
+import os
+import re
 import sys
+import hashlib
+import subprocess
+from importlib import metadata
+
+REQUIREMENTS = 'requirements/cli.txt'
+
+
+def normalize(name):
+    # Package names compare case-insensitively, with runs of -, _ and . being equivalent
+    return re.sub(r'[-_.]+', '-', name).lower()
+
 
 def get_installed_packages():
-    try:
-        result = subprocess.check_output([sys.executable, '-m', 'pip', 'freeze'], universal_newlines=True)
-        installed_packages = {line.strip().lower() for line in result.splitlines() if line.strip()}
-        return installed_packages
-    except subprocess.CalledProcessError:
-        print("Error retrieving installed packages.")
-        sys.exit(1)
+    # Reading the installed metadata is much faster than shelling out to `pip freeze`
+    installed_packages = {}
+    for distribution in metadata.distributions():
+        name = distribution.metadata['Name']
+        if name:
+            installed_packages[normalize(name)] = distribution.version
+    return installed_packages
+
+
+def is_installed(requirement, installed_packages):
+    name, _, version = requirement.partition('==')
+    installed_version = installed_packages.get(normalize(name.strip()))
+    return installed_version is not None and (not version or installed_version == version.strip())
+
+
+def stamp_path(requirements):
+    # A successful check is remembered per requirements file content and interpreter
+    digest = hashlib.sha256(requirements.encode())
+    digest.update(f"{sys.executable}:{sys.version}".encode())
+    cache_dir = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'shoppy')
+    return os.path.join(cache_dir, f"requirements-{digest.hexdigest()[:16]}")
+
 
 def check_requirements():
     try:
-        with open('requirements/cli.txt', 'r') as file:
-            required_packages = {line.strip().lower() for line in file.readlines() if line.strip()}
+        with open(REQUIREMENTS, 'r') as file:
+            requirements = file.read()
     except FileNotFoundError:
-        print("Error: requirements/cli.txt not found.")
+        print(f"Error: {REQUIREMENTS} not found.")
         sys.exit(1)
 
+    stamp = stamp_path(requirements)
+    if os.path.exists(stamp):
+        return
+
+    required_packages = {line.strip() for line in requirements.splitlines() if line.strip()}
     installed_packages = get_installed_packages()
 
-    missing_packages = required_packages - installed_packages
+    missing_packages = [
+        package for package in required_packages if not is_installed(package, installed_packages)
+    ]
 
-    if missing_packages and len(missing_packages) > 0:
+    if missing_packages:
         print("Missing packages:")
         for package in missing_packages:
             print(f"  - {package}")
@@ -35,5 +69,13 @@ def check_requirements():
     else:
         print("All required packages are installed.")
 
+    try:
+        os.makedirs(os.path.dirname(stamp), exist_ok=True)
+        with open(stamp, 'w') as file:
+            file.write(requirements)
+    except OSError:
+        pass
+
+
 if __name__ == "__main__":
-    check_requirements()
\ No newline at end of file
+    check_requirements()
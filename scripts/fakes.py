@@ -0,0 +1,303 @@
+"""Local stand-ins for the OpenAI streaming APIs and SerpAPI, for benchmarks."""
+import time, random, asyncio, itertools
+from types import SimpleNamespace
+from urllib.parse import quote_plus
+from openai.types.beta.assistant_stream_event import (
+    ThreadRunCompleted,
+    ThreadRunCreated,
+    ThreadRunRequiresAction,
+    ThreadMessageDelta,
+)
+from openai.types.beta.threads import MessageDeltaEvent, RequiredActionFunctionToolCall, Run
+from openai.types.beta.threads.run import RequiredAction, RequiredActionSubmitToolOutputs
+from openai.types.chat import ChatCompletionChunk
+from src.backend import SearchBackend
+from src.error import NoResultsError
+
+__all__ = ["Latency", "FakeOpenAI", "SimulatedSerpApi"]
+
+
+class Latency:
+    """A latency distribution in seconds: `fixed:S`, `uniform:LOW,HIGH` or `lognormal:MEDIAN,SIGMA`."""
+
+    def __init__(self, kind: str = "fixed", *args: float, seed: int = None):
+        self.kind = kind
+        self.args = args or (0.0,)
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = None) -> "Latency":
+        kind, _, values = spec.partition(":")
+        if not values:
+            kind, values = "fixed", kind
+        return cls(kind, *[float(v) for v in values.split(",")], seed=seed)
+
+    def __call__(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self._random.uniform(*self.args)
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return self._random.lognormvariate(0, sigma) * median
+        raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+    def __str__(self):
+        return f"{self.kind}:{','.join(str(a) for a in self.args)}"
+
+
+class FakeStream:
+    """A scripted event stream that sleeps like the real one between events."""
+
+    def __init__(self, events: list, first_event: Latency, delta: Latency):
+        self.events = events
+        self.first_event = first_event
+        self.delta = delta
+
+    def __iter__(self):
+        time.sleep(self.first_event())
+        for event in self.events:
+            if self._is_text(event):
+                time.sleep(self.delta())
+            yield event
+
+    @staticmethod
+    def _is_text(event) -> bool:
+        if isinstance(event, ChatCompletionChunk):
+            return bool(event.choices and event.choices[0].delta.content)
+        return event.event == "thread.message.delta"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+class FakeOpenAI:
+    """A scripted stand-in for the `client.beta.threads` Assistants API used by Runner, and the
+    `client.chat.completions` API used by ChatRunner.
+
+    Each turn of the scenario is a list of rounds; every round but the last asks for
+    `tool_calls`, and the last streams its `text` before completing the run.
+    """
+
+    def __init__(
+        self,
+        turns: list[dict],
+        api: Latency = None,
+        first_event: Latency = None,
+        delta: Latency = None,
+    ):
+        self.turns = iter(turns)
+        self.api = api or Latency()
+        self.first_event = first_event or Latency()
+        self.delta = delta or Latency()
+        self.api_calls = 0
+        self.tool_outputs: list[list[dict]] = []
+        self._rounds = iter(())
+        self._ids = itertools.count()
+
+        threads = SimpleNamespace(
+            create=self._create_thread,
+            messages=SimpleNamespace(create=self._create_message),
+            runs=SimpleNamespace(
+                create=self._create_run,
+                submit_tool_outputs=self._submit_tool_outputs,
+                cancel=self._call,
+                list=self._list_runs,
+            ),
+        )
+        self.beta = SimpleNamespace(threads=threads)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+
+    def _call(self, **_):
+        self.api_calls += 1
+        time.sleep(self.api())
+
+    def _list_runs(self, **kwargs):
+        self._call(**kwargs)
+        return SimpleNamespace(data=[])
+
+    def _create_thread(self, **kwargs):
+        self._call(**kwargs)
+        # A thread can be created with the turn's first message
+        if any(message["role"] == "user" for message in kwargs.get("messages", [])):
+            self._rounds = iter(next(self.turns)["rounds"])
+        return SimpleNamespace(id=f"thread_{next(self._ids)}")
+
+    def _create_message(self, **kwargs):
+        self._call(**kwargs)
+        self._rounds = iter(next(self.turns)["rounds"])
+
+    def _create_run(self, **_):
+        self.api_calls += 1
+        return self._stream(created=True)
+
+    def _submit_tool_outputs(self, tool_outputs: list[dict], **_):
+        self.api_calls += 1
+        self.tool_outputs.append(tool_outputs)
+        return self._stream(created=False)
+
+    def _create_completion(self, messages: list[dict], **_) -> FakeStream:
+        self.api_calls += 1
+
+        # A user message starts the next turn; otherwise the request carries the round's tool outputs
+        if messages[-1]["role"] == "user":
+            self._rounds = iter(next(self.turns)["rounds"])
+        else:
+            outputs = list(itertools.takewhile(lambda m: m["role"] == "tool", reversed(messages)))
+            self.tool_outputs.append([{"tool_call_id": m["tool_call_id"], "output": m["content"]} for m in outputs[::-1]])
+
+        round = next(self._rounds)
+        chunks = []
+        for i, (name, arguments) in enumerate(round.get("tool_calls") or []):
+            function = {"name": name, "arguments": arguments}
+            chunks.append(self._chunk({"tool_calls": [{"index": i, "id": f"call_{next(self._ids)}", "function": function}]}))
+        text = round.get("text", "")
+        for i in range(0, len(text), 8):
+            chunks.append(self._chunk({"content": text[i : i + 8]}))
+        chunks.append(self._chunk({}, finish_reason="tool_calls" if round.get("tool_calls") else "stop"))
+
+        return FakeStream(chunks, self.first_event, self.delta)
+
+    def _chunk(self, delta: dict, finish_reason: str = None) -> ChatCompletionChunk:
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "chatcmpl_0",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "fake",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+        )
+
+    def _stream(self, created: bool) -> FakeStream:
+        round = next(self._rounds)
+        events = []
+
+        if created:
+            events.append(ThreadRunCreated(event="thread.run.created", data=self._run("queued")))
+
+        if round.get("tool_calls"):
+            run = self._run("requires_action", round["tool_calls"])
+            events.append(ThreadRunRequiresAction(event="thread.run.requires_action", data=run))
+        else:
+            text = round.get("text", "")
+            for i in range(0, len(text), 8):
+                events.append(self._delta(text[i : i + 8]))
+            events.append(ThreadRunCompleted(event="thread.run.completed", data=self._run("completed")))
+
+        return FakeStream(events, self.first_event, self.delta)
+
+    def _run(self, status: str, tool_calls: list = None) -> Run:
+        required_action = None
+        if tool_calls:
+            required_action = RequiredAction(
+                type="submit_tool_outputs",
+                submit_tool_outputs=RequiredActionSubmitToolOutputs(
+                    tool_calls=[
+                        RequiredActionFunctionToolCall.model_validate(
+                            {
+                                "id": f"call_{next(self._ids)}",
+                                "type": "function",
+                                "function": {"name": name, "arguments": arguments},
+                            }
+                        )
+                        for name, arguments in tool_calls
+                    ]
+                ),
+            )
+
+        return Run.model_construct(id="run_0", status=status, required_action=required_action)
+
+    def _delta(self, text: str) -> ThreadMessageDelta:
+        data = MessageDeltaEvent.model_validate(
+            {
+                "id": "msg_0",
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text}}]},
+            }
+        )
+        return ThreadMessageDelta(event="thread.message.delta", data=data)
+
+
+class SimulatedSerpApi(SearchBackend):
+    """A search backend that generates SerpAPI-shaped responses after a simulated latency."""
+
+    def __init__(self, latency: Latency = None, products: int = 40, error_rate: float = 0.0, seed: int = None):
+        self.latency = latency or Latency()
+        self.products = products
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+
+    async def fetch(self, params: dict) -> dict:
+        self.requests += 1
+        await asyncio.sleep(self.latency())
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise NoResultsError("Simulated failure")
+
+        if params.get("engine") == "google_product":
+            return self._details(params.get("product_id", "0"))
+
+        return self._search(params.get("q", ""))
+
+    def _search(self, query: str) -> dict:
+        link = f"https://serpapi.com/search.json?engine=google_shopping&q={quote_plus(query)}"
+        return {
+            "search_metadata": {"id": "search", "status": "Success"},
+            "search_parameters": {"engine": "google_shopping", "q": query},
+            "filters": [
+                {
+                    "type": name,
+                    "options": [
+                        {"text": f"{name} {i}", "tbs": f"mr:1,{name}:{i}", "serpapi_link": f"{link}&tbs=mr:1,{name}:{i}"}
+                        for i in range(12)
+                    ],
+                }
+                for name in ("Price", "Seller", "Brand", "Features")
+            ],
+            "shopping_results": [self._product(query, i) for i in range(self.products)],
+        }
+
+    def _product(self, query: str, i: int) -> dict:
+        product_id = f"{abs(hash(query)) % 10_000}{i}"
+        price = round(20 + self._random.random() * 300, 2)
+        return {
+            "position": i + 1,
+            "title": f"{query.title()} Model {i}",
+            "link": f"https://www.google.com/shopping/product/{product_id}?{'x' * 120}",
+            "product_link": f"https://www.google.com/shopping/product/{product_id}",
+            "product_id": product_id,
+            "serpapi_product_api": f"https://serpapi.com/search.json?engine=google_product&product_id={product_id}",
+            "source": f"Store {i % 7}",
+            "price": f"${price}",
+            "extracted_price": price,
+            "rating": round(3 + self._random.random() * 2, 1),
+            "reviews": self._random.randint(0, 5_000),
+            "thumbnail": f"https://encrypted-tbn0.gstatic.com/shopping?q=tbn:{'A' * 300}",
+            "delivery": "Free delivery",
+        }
+
+    def _details(self, product_id: str) -> dict:
+        return {
+            "search_metadata": {"id": "details", "status": "Success"},
+            "search_parameters": {"engine": "google_product", "product_id": product_id},
+            "product_results": {
+                "product_id": product_id,
+                "title": f"Product {product_id}",
+                "description": "A simulated product. " * 40,
+                "media": [{"type": "image", "link": f"https://example.com/{i}.jpg"} for i in range(10)],
+                "rating": 4.4,
+                "reviews": 1_200,
+            },
+            "sellers_results": {
+                "online_sellers": [
+                    {"name": f"Store {i}", "link": f"https://example.com/{i}", "base_price": f"${100 + i}"}
+                    for i in range(15)
+                ]
+            },
+            "specs_results": {"details": {f"Spec {i}": f"Value {i}" for i in range(30)}},
+        }
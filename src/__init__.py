@@ -2,6 +2,13 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from .agent import Agent
+__all__ = ['Agent']
 
-__all__ = ['Agent']
\ No newline at end of file
+
+def __getattr__(name):
+    # The agent pulls in openai, httpx and pydantic; import them on first use, not with the package
+    if name == "Agent":
+        from .agent import Agent
+
+        return Agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,9 @@
+import os
 from openai import OpenAI
+from .chat_runner import ChatRunner
+from .context import ContextPolicy
+from .dispatch import Dispatcher
+from .prefetch import DetailPrefetcher
 from .runner import Runner
 
 __all__ = ["Agent"]
@@ -7,19 +12,61 @@ __all__ = ["Agent"]
 class Agent:
     """A class to represent the agent that interacts with the user and remote services."""
 
+    # `assistants` runs on Assistants API threads; `chat` keeps the conversation locally and streams chat completions
+    MODES = {"assistants": Runner, "chat": ChatRunner}
+
     def __init__(
         self,
         client: OpenAI,
         on_product_list: callable,
         on_text_changed: callable,
         thread_id: str = None,
+        max_tool_concurrency: int = 8,
+        max_rounds: int = 10,
+        dispatcher: Dispatcher = None,
+        context: ContextPolicy = None,
+        prefetcher: DetailPrefetcher = None,
+        mode: str = None,
     ):
-        """Initializes the Agent object with the provided OpenAI client."""
-        self.runner = Runner(client, on_product_list, on_text_changed, thread_id)
+        """Initializes the Agent object with the provided OpenAI client and an optional shared dispatcher.
+
+        `context` bounds how much of a long conversation each run sees, and `prefetcher` fetches the details
+        of top search results ahead of time; both default to the environment. `mode` selects the runner,
+        from SHOPPY_RUNNER by default.
+        """
+        self.mode = self.resolve_mode(mode)
+        self.runner = self.MODES[self.mode](
+            client,
+            on_product_list,
+            on_text_changed,
+            thread_id,
+            max_tool_concurrency=max_tool_concurrency,
+            max_rounds=max_rounds,
+            dispatcher=dispatcher,
+            context=context,
+            prefetcher=prefetcher,
+        )
+
+    def prepare(self):
+        """Does the network setup of the conversation ahead of the first search."""
+        self.runner.prepare()
+
+    def search(self, input: str, timeout: float = None):
+        """The default run execution. Tool calls still running `timeout` seconds into the search are cut short."""
+        self.runner.start(input, timeout=timeout)
+
+    @classmethod
+    def resolve_mode(cls, mode: str = None) -> str:
+        """Returns the runner mode to use, validating the provided or configured one."""
+
+        mode = mode or os.getenv("SHOPPY_RUNNER") or "assistants"
+        if mode not in cls.MODES:
+            raise ValueError(f"Unknown runner mode {mode!r}, expected one of {sorted(cls.MODES)}")
+        return mode
 
-    def search(self, input: str):
-        """The default run execution."""
-        self.runner.start(input)
+    @property
+    def thread_id(self) -> str | None:
+        return self.runner.thread_id
 
     def __str__(self):
         return self.__class__.__name__
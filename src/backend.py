@@ -0,0 +1,182 @@
+import os, abc, json, random, hashlib, asyncio
+import httpx
+from typing import Callable
+from .cache import IGNORED_PARAMS, cache_key
+from .error import RemoteServiceError
+from .utils import log
+
+__all__ = ["SearchBackend", "SerpApiBackend", "ReplayBackend", "default_backend"]
+
+
+class SearchBackend(abc.ABC):
+    """A base class for the remote services the Dispatcher sends requests to."""
+
+    @abc.abstractmethod
+    async def fetch(self, params: dict) -> dict:
+        """Returns the decoded response for the provided request parameters."""
+
+    async def aclose(self) -> None:
+        """Releases the resources held by the backend."""
+        pass
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class SerpApiBackend(SearchBackend):
+    """A backend that requests SerpAPI over a pooled keep-alive HTTP client."""
+
+    _search_url = "https://serpapi.com/search"
+
+    def __init__(self, search_url: str = None, api_key: str = None, max_connections: int = 20, timeout: float = 30.0):
+        self.search_url = search_url or os.getenv("SERP_API_URL") or self._search_url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+
+    async def fetch(self, params: dict) -> dict:
+        api_key = self.api_key or os.getenv("SERP_API_KEY")
+        if not api_key:
+            raise ValueError("SERP_API_KEY environment variable is not set.")
+
+        response = await self._http().get(
+            self.search_url, params={**params, "api_key": api_key, "output": "json", "source": "python"}
+        )
+
+        # Rate limits and server errors are transient; other failures are not
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("retry-after")
+            raise RemoteServiceError(
+                f"SERP API responded with {response.status_code}",
+                status=response.status_code,
+                retryable=True,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+
+        try:
+            return response.json()
+        except ValueError:
+            raise RemoteServiceError(
+                f"SERP API responded with {response.status_code} and no JSON",
+                status=response.status_code,
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def _http(self) -> httpx.AsyncClient:
+        """Returns the pooled HTTP client, creating it on first use."""
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+
+        return self._client
+
+
+class ReplayBackend(SearchBackend):
+    """A backend that replays JSON cassettes, recording them from another backend when asked."""
+
+    def __init__(
+        self,
+        cassette_dir: str,
+        record_from: SearchBackend = None,
+        latency: float | tuple[float, float] | Callable[[], float] = 0.0,
+        error_rate: float = 0.0,
+        seed: int = None,
+    ):
+        """Replays cassettes from `cassette_dir`; with `record_from`, missing cassettes are recorded from that backend.
+
+        `latency` is a fixed delay, a (min, max) range or a sampling function in seconds, and `error_rate` is the
+        probability of failing a request with a retryable 503, to simulate an unhealthy backend.
+        """
+        self.cassette_dir = cassette_dir
+        self.record_from = record_from
+        self.latency = latency
+        self.error_rate = error_rate
+        self.replayed = 0
+        self.recorded = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    async def fetch(self, params: dict) -> dict:
+        await self._delay()
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            raise RemoteServiceError("Injected failure", status=503, retryable=True)
+
+        # Read and write cassettes off the event loop, which is shared by every request
+        cassette = await asyncio.to_thread(self._load, self.path(params))
+        if cassette is not None:
+            self.replayed += 1
+            return cassette["response"]
+
+        if self.record_from is None:
+            raise RemoteServiceError(f"No cassette for {cache_key(params)}", status=404)
+
+        response = await self.record_from.fetch(params)
+        await asyncio.to_thread(self.record, params, response)
+        return response
+
+    def record(self, params: dict, response: dict) -> None:
+        """Stores the response as the cassette of the provided parameters. Blocks on the file I/O."""
+
+        cassette = {
+            "params": {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+            "response": response,
+        }
+        with open(self.path(params), "w") as file:
+            json.dump(cassette, file)
+
+        self.recorded += 1
+        log(lambda: f"Recorded cassette for {params.get('engine')}: {params.get('q')}")
+
+    def path(self, params: dict) -> str:
+        """Returns the cassette file of the provided parameters."""
+        digest = hashlib.sha1(cache_key(params).encode()).hexdigest()
+        return os.path.join(self.cassette_dir, f"{digest}.json")
+
+    @staticmethod
+    def _load(path: str) -> dict | None:
+        """Returns the decoded cassette at the path, or None if there is none."""
+
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    async def aclose(self) -> None:
+        if self.record_from is not None:
+            await self.record_from.aclose()
+
+    async def _delay(self) -> None:
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        elif callable(latency):
+            latency = latency()
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+
+def default_backend() -> SearchBackend:
+    """Returns the search backend configured by the environment."""
+
+    cassette_dir = os.getenv("SERP_CASSETTES")
+    if not cassette_dir:
+        return SerpApiBackend()
+
+    # Replay only, unless recording was asked for
+    record = os.getenv("SERP_RECORD", "").lower() in ("1", "true", "yes")
+    return ReplayBackend(cassette_dir, record_from=SerpApiBackend() if record else None)
@@ -0,0 +1,303 @@
+import os, re, abc, json, time, asyncio, sqlite3, threading
+from collections import OrderedDict
+
+__all__ = ["ResponseCache", "MemoryCache", "SQLiteCache", "cache_key", "default_cache"]
+
+# Seconds a response stays fresh, per SerpAPI engine.
+DEFAULT_TTLS = {
+    "google_shopping": 60 * 60,
+    "google_product": 6 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+# Parameters that never change the response.
+IGNORED_PARAMS = {"api_key", "output", "source"}
+
+
+def cache_key(params: dict) -> str:
+    """Returns a stable key for the provided request parameters, ignoring the API key."""
+
+    normalized = {}
+    for key, value in params.items():
+        if key in IGNORED_PARAMS or value is None or value == "":
+            continue
+        value = str(value).strip()
+        if key == "q":
+            value = re.sub(r"\s+", " ", value).lower()
+        normalized[key] = value
+
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseCache(abc.ABC):
+    """A base class for response caches keyed by normalized request parameters."""
+
+    def __init__(self, ttls: dict[str, float] = None, default_ttl: float = DEFAULT_TTL):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, params: dict) -> dict | None:
+        """Returns the cached response for the provided parameters, if it is still fresh."""
+
+        key = cache_key(params)
+        with self._lock:
+            value = self._get(key, time.time())
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return json.loads(value) if value is not None else None
+
+    def set(self, params: dict, response: dict) -> None:
+        """Stores the response for the provided parameters using the engine's TTL."""
+
+        ttl = self.ttl(params.get("engine"))
+        if ttl <= 0:
+            return
+
+        value = json.dumps(response)
+        with self._lock:
+            self._set(cache_key(params), params.get("engine") or "", value, time.time() + ttl)
+
+    async def aget(self, params: dict) -> dict | None:
+        """Returns the cached response like `get`, for caches that never block the event loop."""
+        return self.get(params)
+
+    async def aset(self, params: dict, response: dict) -> None:
+        """Stores the response like `set`, for caches that never block the event loop."""
+        self.set(params, response)
+
+    def ttl(self, engine: str) -> float:
+        """Returns the time to live for responses of the provided engine."""
+        return self.ttls.get(engine, self.default_ttl)
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counters of the cache."""
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self),
+        }
+
+    def clear(self) -> None:
+        """Removes every entry from the cache."""
+        with self._lock:
+            self._clear()
+
+    @abc.abstractmethod
+    def _get(self, key: str, now: float) -> str | None:
+        pass
+
+    @abc.abstractmethod
+    def _set(self, key: str, engine: str, value: str, expires_at: float) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _clear(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def __len__(self):
+        pass
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class MemoryCache(ResponseCache):
+    """An in-memory LRU response cache bounded by entry count and size."""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttls: dict[str, float] = None,
+        default_ttl: float = DEFAULT_TTL,
+    ):
+        super().__init__(ttls=ttls, default_ttl=default_ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._bytes = 0
+
+    def _get(self, key: str, now: float) -> str | None:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= now:
+            self._pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, engine: str, value: str, expires_at: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._pop(key)
+
+        self._entries[key] = (expires_at, value)
+        self._bytes += len(value)
+
+        # Evict the least recently used entries
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """A persistent response cache stored in a SQLite database.
+
+    Hits only read the database: their access times are kept in memory and written with the next
+    stored response, or every `touch_batch` hits. `aget` and `aset` run the disk I/O off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttls: dict[str, float] = None,
+        default_ttl: float = DEFAULT_TTL,
+        touch_batch: int = 64,
+    ):
+        super().__init__(ttls=ttls, default_ttl=default_ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        # Access times of the entries hit since the last write, by key
+        self._accessed: dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                engine TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._connection.commit()
+
+    def _get(self, key: str, now: float) -> str | None:
+        row = self._connection.execute(
+            "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+
+        value, expires_at = row
+        if expires_at <= now:
+            # Expired entries are deleted with the next eviction
+            return None
+
+        self._accessed[key] = now
+        if len(self._accessed) >= self.touch_batch:
+            self._touch()
+            self._connection.commit()
+        return value
+
+    def _set(self, key: str, engine: str, value: str, expires_at: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        now = time.time()
+        self._accessed.pop(key, None)
+        self._touch()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, engine, value, len(value), expires_at, now),
+        )
+        self._evict(now)
+        self._connection.commit()
+
+    async def aget(self, params: dict) -> dict | None:
+        return await asyncio.to_thread(self.get, params)
+
+    async def aset(self, params: dict, response: dict) -> None:
+        await asyncio.to_thread(self.set, params, response)
+
+    def _touch(self) -> None:
+        """Writes the pending access times, so eviction sees the recently used entries."""
+
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _evict(self, now: float) -> None:
+        self._connection.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+
+        count, size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+        # Evict the least recently used entries
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        )
+        evicted = []
+        for key, entry_size in rows:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            size -= entry_size
+
+        if evicted:
+            self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def _clear(self) -> None:
+        self._accessed.clear()
+        self._connection.execute("DELETE FROM responses")
+        self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def default_cache() -> ResponseCache:
+    """Returns the response cache configured by the environment."""
+
+    path = os.getenv("SERP_CACHE_PATH")
+    if path:
+        return SQLiteCache(path)
+
+    return MemoryCache()
@@ -0,0 +1,292 @@
+import os, re, json, math, time, queue, sqlite3, threading
+from .merge import product_keys
+from .tracing import tracer
+from .utils import WARNING, log
+
+__all__ = ["ProductCatalog"]
+
+# Products not seen again for a week are no longer offered as candidates.
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+# Words of shopping queries that say nothing about the product.
+STOPWORDS = frozenset(
+    """
+    a an and are at best buy by cheap cheapest deal deals for from good great in is me near new of on or
+    over sale the to top under with without
+    """.split()
+)
+
+
+class ProductCatalog:
+    """A persistent catalog of every product seen, with a full-text index over titles, sources and specs.
+
+    Writes are queued and applied in batches by a background thread, so storing products never blocks
+    the caller; `search` reads the database directly and is meant to run off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_entries: int = 50_000,
+        evict_interval: float = 60.0,
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes = queue.SimpleQueue()
+        self._evicted_at = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                key TEXT PRIMARY KEY,
+                product TEXT NOT NULL,
+                details TEXT,
+                updated_at REAL NOT NULL,
+                details_at REAL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS products_updated_at ON products (updated_at)")
+        # Rows of the index share the rowid of their product
+        self._connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_index USING fts5(title, source, specs, tokenize='porter unicode61')"
+        )
+        self._connection.commit()
+
+        self._writer = threading.Thread(target=self._run, name="shoppy-catalog", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> "ProductCatalog | None":
+        """Returns the catalog stored at SHOPPY_CATALOG_PATH, or None when unset or unsupported."""
+
+        path = os.getenv("SHOPPY_CATALOG_PATH")
+        if not path:
+            return None
+
+        max_age = float(os.getenv("SHOPPY_CATALOG_MAX_AGE") or DEFAULT_MAX_AGE)
+        try:
+            return cls(path, max_age=max_age)
+        except sqlite3.OperationalError as error:
+            # SQLite builds without FTS5 can't index the catalog
+            log(lambda: f"Product catalog disabled: {error}", level=WARNING)
+            return None
+
+    def upsert(self, products: list[dict]) -> None:
+        """Queues the products returned by a search or filter, replacing older copies of them."""
+        if products:
+            self._writes.put(("products", products, time.time()))
+
+    def upsert_details(self, product_id: str, details: dict) -> None:
+        """Queues the details of a product, whose specs get indexed."""
+        self._writes.put(("details", (str(product_id), details), time.time()))
+
+    def search(self, text: str, limit: int = 10) -> list[dict]:
+        """Returns the fresh products best matching the text, best first.
+
+        Products matching every term come first; when there are none, products matching at least
+        half of the terms are offered instead, so "best ANC headphones" still finds "noise cancelling
+        headphones" without every product mentioning "best".
+        """
+
+        terms = [
+            term for term in re.findall(r"\w+", text.lower()) if term not in STOPWORDS and not term.isdigit()
+        ]
+        if not terms:
+            return []
+
+        quoted = [f'"{term}"' for term in terms]
+        rows = self._match(" AND ".join(quoted), limit)
+        if not rows and len(terms) > 1:
+            required = math.ceil(len(terms) / 2)
+            rows = [
+                row
+                for row in self._match(" OR ".join(quoted), limit * 4)
+                if sum(self._matches(term, row[1]) for term in terms) >= required
+            ][:limit]
+
+        if rows:
+            self.hits += 1
+        else:
+            self.misses += 1
+        tracer.increment("catalog.searches", outcome="hit" if rows else "miss")
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> dict:
+        """Returns the catalog size and how often searches found candidates."""
+
+        total = self.hits + self.misses
+        return {
+            "products": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self) -> None:
+        """Stores the queued writes, then closes the database."""
+
+        self._writes.put(None)
+        self._writer.join()
+        with self._lock:
+            self._connection.close()
+
+    def _match(self, match: str, limit: int) -> list[tuple[str, str]]:
+        """Returns the fresh products and their indexed text matching the FTS5 query, best first."""
+
+        with self._lock:
+            return self._connection.execute(
+                """
+                SELECT products.product, products_index.title || ' ' || products_index.source || ' ' || products_index.specs
+                FROM products_index
+                JOIN products ON products.rowid = products_index.rowid
+                WHERE products_index MATCH ? AND products.updated_at >= ?
+                ORDER BY bm25(products_index) LIMIT ?
+                """,
+                (match, time.time() - self.max_age, limit),
+            ).fetchall()
+
+    @staticmethod
+    def _matches(term: str, text: str) -> bool:
+        # The index stems words, so compare word prefixes rather than whole words
+        return re.search(rf"\b{re.escape(term[:max(4, len(term) - 2)])}", text.lower()) is not None
+
+    def _run(self) -> None:
+        """Applies the queued writes, one transaction per batch."""
+
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            with self._lock:
+                try:
+                    for write in batch:
+                        if write is None:
+                            stop = True
+                            continue
+                        kind, value, now = write
+                        if kind == "products":
+                            self._store_products(value, now)
+                        else:
+                            self._store_details(*value, now)
+
+                    if time.time() - self._evicted_at >= self.evict_interval:
+                        self._evict(time.time())
+                    self._connection.commit()
+                except sqlite3.Error as error:
+                    self._connection.rollback()
+                    log(lambda: f"Could not store products in the catalog: {error!r}", level=WARNING)
+
+            if stop:
+                return
+
+    def _store_products(self, products: list[dict], now: float) -> None:
+        for product in products:
+            key = self._key(product)
+            if key is not None:
+                self._write(key, product, now)
+
+    def _store_details(self, product_id: str, details: dict, now: float) -> None:
+        summary = details.get("product_results") or {}
+        product = {
+            "product_id": product_id,
+            **{k: summary[k] for k in ("title", "rating", "reviews") if k in summary},
+        }
+        key = self._key(product)
+
+        # Keep the search result already stored, with its price and source
+        row = self._connection.execute("SELECT product FROM products WHERE key = ?", (key,)).fetchone()
+        if row:
+            product = json.loads(row[0])
+        self._write(key, product, now, details=details)
+
+    def _write(self, key: str, product: dict, now: float, details: dict = None) -> None:
+        """Upserts the product row and its index entry. Runs on the writer thread, with the lock held."""
+
+        encoded = json.dumps(product)
+        if details is None:
+            self._connection.execute(
+                """
+                INSERT INTO products (key, product, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET product = excluded.product, updated_at = excluded.updated_at
+                """,
+                (key, encoded, now),
+            )
+        else:
+            self._connection.execute(
+                """
+                INSERT INTO products (key, product, details, updated_at, details_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET details = excluded.details, details_at = excluded.details_at
+                """,
+                (key, encoded, json.dumps(details), now, now),
+            )
+
+        rowid, stored = self._connection.execute(
+            "SELECT rowid, details FROM products WHERE key = ?", (key,)
+        ).fetchone()
+        specs = " ".join(self._strings(json.loads(stored).get("specs_results"))) if stored else ""
+
+        self._connection.execute("DELETE FROM products_index WHERE rowid = ?", (rowid,))
+        self._connection.execute(
+            "INSERT INTO products_index (rowid, title, source, specs) VALUES (?, ?, ?, ?)",
+            (rowid, product.get("title") or "", product.get("source") or "", specs),
+        )
+
+    def _evict(self, now: float) -> None:
+        """Removes the products not seen for too long, then the oldest ones beyond the size limit."""
+
+        self._evicted_at = now
+        expired = now - self.max_age
+        count = self._connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        rows = self._connection.execute(
+            "SELECT rowid FROM products WHERE updated_at < ? OR rowid IN "
+            "(SELECT rowid FROM products ORDER BY updated_at ASC LIMIT MAX(0, ?))",
+            (expired, count - self.max_entries),
+        ).fetchall()
+
+        if rows:
+            self._connection.executemany("DELETE FROM products_index WHERE rowid = ?", rows)
+            self._connection.executemany("DELETE FROM products WHERE rowid = ?", rows)
+
+    @staticmethod
+    def _key(product: dict) -> str | None:
+        """Returns the catalog key of the product: its product id, or its normalized title and source."""
+
+        keys = product_keys(product)
+        return ":".join(keys[0]) if keys else None
+
+    @classmethod
+    def _strings(cls, value) -> list[str]:
+        """Returns every string nested in the value, to index specs of any shape."""
+
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, dict):
+            return [s for k, v in value.items() for s in (k, *cls._strings(v))]
+        if isinstance(value, list):
+            return [s for v in value for s in cls._strings(v)]
+        return []
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def __str__(self):
+        return self.__class__.__name__
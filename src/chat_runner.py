@@ -0,0 +1,157 @@
+import os, time, uuid
+from openai import OpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+from .context import ContextPolicy
+from .dispatch import Dispatcher
+from .error import MaxRoundsExceededError
+from .prefetch import DetailPrefetcher
+from .runner import BaseRunner
+from .tools import execute_search, filter, instructions, product_detailts
+from .tracing import tracer
+from .utils import INFO, log
+
+__all__ = ["ChatRunner"]
+
+
+class ChatRunner(BaseRunner):
+    """A runner that keeps the conversation locally and streams chat completions, one request per round."""
+
+    _model = "gpt-4o"
+    _labels = {"mode": "chat"}
+
+    def __init__(
+        self,
+        client: OpenAI,
+        on_product_list: callable,
+        on_text_changed: callable,
+        thread_id: str = None,
+        max_tool_concurrency: int = 8,
+        max_rounds: int = 10,
+        dispatcher: Dispatcher = None,
+        context: ContextPolicy = None,
+        prefetcher: DetailPrefetcher = None,
+        model: str = None,
+    ):
+        super().__init__(
+            client,
+            on_product_list,
+            on_text_changed,
+            max_tool_concurrency=max_tool_concurrency,
+            max_rounds=max_rounds,
+            dispatcher=dispatcher,
+            context=context,
+            prefetcher=prefetcher,
+        )
+        self.model = model or os.getenv("SHOPPY_MODEL") or self._model
+        # There is no server-side thread; the id only names the local conversation
+        self.thread_id = thread_id or f"chat_{uuid.uuid4().hex}"
+        self.messages: list[dict] = []
+        self.tools = [{"type": "function", "function": tool()} for tool in (execute_search, product_detailts, filter)]
+
+    def _start(self, query: str, deadline: float = None) -> None:
+        turn_started = time.perf_counter()
+
+        if self.messages and self.context.should_roll_over():
+            # Carry on from a summary instead of resending every earlier tool output
+            log(lambda: f"Compacting conversation at {self.context.tool_output_bytes} bytes", level=INFO)
+            self.messages = [{"role": "assistant", "content": self.context.roll_over()}]
+            self.stats.rolled_over = True
+            tracer.increment("runner.rollovers", mode="chat")
+
+        self.messages.append({"role": "user", "content": query})
+        asked = len(self.messages)
+
+        # Stream -> collect tool calls -> execute -> stream again, until no more tools are called
+        try:
+            while True:
+                with tracer.span("runner.step", mode="chat", round=self.stats.tool_rounds):
+                    text, tool_calls = self._stream(turn_started)
+                    turn_started = None
+
+                message = {"role": "assistant", "content": text or None}
+                if tool_calls:
+                    message["tool_calls"] = [tool_call.model_dump() for tool_call in tool_calls]
+                self.messages.append(message)
+
+                if not tool_calls:
+                    break
+
+                if self.stats.tool_rounds >= self.max_rounds:
+                    raise MaxRoundsExceededError(self.max_rounds)
+
+                self.stats.tool_rounds += 1
+                self.stats.tool_calls += len(tool_calls)
+
+                with tracer.span("runner.tool_round", mode="chat"):
+                    tool_outputs = self.executor.execute(tool_calls, deadline)
+
+                self._add_tool_outputs(tool_outputs)
+
+                self.messages += [
+                    {"role": "tool", "tool_call_id": o["tool_call_id"], "content": o["output"]} for o in tool_outputs
+                ]
+        except BaseException:
+            # Drop the unfinished turn, so no tool call is left without its output and the conversation
+            # stays answerable after an interrupt, a failed round or too many rounds
+            del self.messages[asked:]
+            raise
+
+    def _stream(self, turn_started: float | None) -> tuple[str, list[ChatCompletionMessageToolCall]]:
+        """Streams one completion, forwarding its text, and returns the text and the tool calls it made."""
+
+        self.stats.api_calls += 1
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": instructions()}, *self._window()],
+            tools=self.tools,
+            parallel_tool_calls=True,
+            stream=True,
+        )
+
+        text = []
+        calls: dict[int, dict] = {}
+        with stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    if turn_started is not None:
+                        tracer.observe("time_to_first_token", time.perf_counter() - turn_started, mode="chat")
+                        turn_started = None
+                    log(lambda: f"assistant text delta > {delta.content!r}", sample=50)
+                    text.append(delta.content)
+                    self._on_text_changed(delta.content)
+
+                # Tool calls arrive in fragments, keyed by their index
+                for fragment in delta.tool_calls or []:
+                    call = calls.setdefault(fragment.index, {"id": "", "name": "", "arguments": ""})
+                    call["id"] = fragment.id or call["id"]
+                    if fragment.function is not None:
+                        call["name"] += fragment.function.name or ""
+                        call["arguments"] += fragment.function.arguments or ""
+
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=call["id"],
+                type="function",
+                function={"name": call["name"], "arguments": call["arguments"]},
+            )
+            for _, call in sorted(calls.items())
+        ]
+        log(lambda: f"\nassistant tool calls > {[t.function.name for t in tool_calls]}")
+        return "".join(text), tool_calls
+
+    def _window(self) -> list[dict]:
+        """Returns the messages sent with the next request, keeping at most the configured number."""
+
+        limit = self.context.policy.truncation
+        if not isinstance(limit, int) or len(self.messages) <= limit:
+            return self.messages
+
+        # Start the window at a user message, so no tool output loses its tool call
+        start = len(self.messages) - limit
+        while start > 0 and self.messages[start]["role"] != "user":
+            start -= 1
+        return self.messages[start:]
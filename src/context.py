@@ -0,0 +1,123 @@
+import os
+from collections import deque
+from pydantic import BaseModel
+from .utils import truncate
+
+__all__ = ["ContextPolicy", "ThreadContext"]
+
+
+class ContextPolicy(BaseModel):
+    """A class to configure how much of a long conversation each run sees."""
+
+    # `auto`, a number of most recent messages to keep, or None for the assistant's default
+    truncation: str | int | None = None
+    # Roll over to a fresh thread once this many bytes of tool outputs are in the current one
+    max_thread_bytes: int | None = None
+    summary_turns: int = 5
+    summary_products: int = 15
+    summary_chars: int = 4_000
+
+    @classmethod
+    def from_env(cls) -> "ContextPolicy":
+        """Reads SHOPPY_TRUNCATION (`auto` or a message count) and SHOPPY_MAX_THREAD_BYTES."""
+
+        truncation = os.getenv("SHOPPY_TRUNCATION") or None
+        if truncation and truncation.isdigit():
+            truncation = int(truncation)
+
+        max_thread_bytes = os.getenv("SHOPPY_MAX_THREAD_BYTES")
+        return cls(
+            truncation=truncation,
+            max_thread_bytes=int(max_thread_bytes) if max_thread_bytes else None,
+        )
+
+    def truncation_strategy(self) -> dict | None:
+        """Returns the `truncation_strategy` of new runs."""
+
+        if self.truncation is None:
+            return None
+        if self.truncation == "auto":
+            return {"type": "auto"}
+        return {"type": "last_messages", "last_messages": int(self.truncation)}
+
+
+class ThreadContext:
+    """A class to track what a thread has accumulated, and summarize it for the next thread."""
+
+    def __init__(self, policy: ContextPolicy):
+        self.policy = policy
+        self.tool_output_bytes = 0
+        self.rollovers = 0
+        # Only what a summary can show is kept, so long sessions don't grow them without bound
+        self.turns: deque[tuple[str, str]] = deque(maxlen=policy.summary_turns)
+        self.products: dict[str, dict] = {}
+        self._query: str | None = None
+        self._text: list[str] = []
+
+    def begin_turn(self, query: str) -> None:
+        self._query = query
+        self._text = []
+
+    def add_text(self, text: str) -> None:
+        self._text.append(text)
+
+    def end_turn(self) -> None:
+        if self._query is not None:
+            self.turns.append((self._query, "".join(self._text)))
+        self._query = None
+        self._text = []
+
+    def add_tool_outputs(self, tool_outputs: list[dict]) -> None:
+        self.tool_output_bytes += sum(len(o["output"].encode()) for o in tool_outputs)
+
+    def add_products(self, products: list[dict]) -> None:
+        for product in products:
+            # Product details keep their summary under `product_results`
+            product = product.get("product_results", product)
+            title = product.get("title")
+            if title:
+                self.products.pop(title, None)
+                self.products[title] = product
+
+        # Forget the products shown longest ago
+        while len(self.products) > self.policy.summary_products:
+            del self.products[next(iter(self.products))]
+
+    def should_roll_over(self) -> bool:
+        """Returns whether the thread is past the size it is allowed to grow to."""
+        limit = self.policy.max_thread_bytes
+        return limit is not None and self.tool_output_bytes >= limit
+
+    def roll_over(self) -> str:
+        """Returns the summary of the conversation so far, and starts counting a fresh thread."""
+
+        summary = self.summary()
+        self.rollovers += 1
+        self.tool_output_bytes = 0
+        return summary
+
+    def summary(self) -> str:
+        """Returns a compact summary of the recent completed turns and the products shown to the user."""
+
+        policy = self.policy
+        lines = ["Summary of the conversation so far, carried over from an earlier thread.", "", "Recent requests:"]
+        for query, reply in self.turns:
+            lines.append(f"- User: {query}")
+            if reply:
+                lines.append(f"  Assistant: {truncate(' '.join(reply.split()), 300)}")
+
+        products = list(self.products.values())
+        if products:
+            lines += ["", "Products shown to the user (most recent last):"]
+            for product in products:
+                fields = [product.get("title")]
+                price = product.get("price") or (product.get("prices") or [None])[0]
+                fields += [str(value) for value in (price, product.get("source"), product.get("rating")) if value]
+                if product.get("product_id"):
+                    fields.append(f"product_id {product['product_id']}")
+                lines.append("- " + ", ".join(fields))
+
+        return truncate("\n".join(lines), policy.summary_chars)
+
+    def __str__(self):
+        return self.__class__.__name__
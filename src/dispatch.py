@@ -1,12 +1,21 @@
-import os, json, asyncio
+import os, json, time, asyncio
+import httpx
+from collections import OrderedDict
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
 from pydantic import BaseModel
-from serpapi import GoogleSearch
-from .error import NoResultsError
-from .utils import log
+from .backend import SearchBackend, default_backend
+from .cache import ResponseCache, cache_key, default_cache
+from .catalog import ProductCatalog
+from .error import CircuitOpenError, NoResultsError, RemoteServiceError
+from .filters import LocalFilterEngine
+from .limits import CircuitBreaker, HedgePolicy, RateLimiter, RetryPolicy
+from .loop import EventLoopThread, background_loop
+from .merge import merge_results
+from .tracing import tracer
+from .utils import WARNING, log
 
-__all__ = ["Dispatcher", "RemoteResult", "SearchQuery"]
+__all__ = ["Dispatcher", "RemoteResult", "MergedResults", "SearchQuery", "Projection", "Projector", "REMOTE_ERRORS"]
 
 
 class Filter(BaseModel):
@@ -29,68 +38,415 @@ class RemoteResult(BaseModel):
     query: str
     products: list[dict]
     filters: list[Filter]
+    error: str | None = None
+    duplicates: int = 0
+    # Whether the products came from the remote service or were filtered locally
+    origin: str = "remote"
     
     def to_string(self):
-        model = self.model_dump()
-        # remove id
-        model.pop("id")
+        # Encode the products and filters as they are, without copying them through model_dump first
+        model = {
+            "query": self.query,
+            "products": self.products,
+            "filters": [{"type": f.type, "options": f.options} for f in self.filters],
+            "error": self.error,
+        }
         return json.dumps(model)
 
+class MergedResults(BaseModel):
+    """A class to represent a batch of results with duplicate products removed."""
+
+    results: list[RemoteResult]
+    duplicates: int
+
+
 class SearchQuery(BaseModel):
     
     id: str
     text: str
 
+
+class Projection(BaseModel):
+    """A class to configure how results are compacted into tool outputs."""
+
+    product_fields: list[str] = [
+        "position",
+        "rank",
+        "title",
+        "product_id",
+        "source",
+        "price",
+        "extracted_price",
+        "old_price",
+        "rating",
+        "reviews",
+        "delivery",
+        "tag",
+        "extensions",
+        "serpapi_product_api",
+    ]
+    filter_options: int = 5
+    option_fields: list[str] = ["text", "serpapi_link"]
+    details_fields: list[str] = [
+        "product_results",
+        "sellers_results",
+        "specs_results",
+        "reviews_results",
+    ]
+    dropped_fields: list[str] = ["thumbnail", "thumbnails", "media", "images", "link", "product_link"]
+    max_list_items: int = 5
+    alias_links: bool = True
+    max_chars: int = 12_000
+    max_tokens: int | None = None
+    # Ask SerpAPI for only the sections that are read, instead of downloading and decoding whole responses
+    restrict_responses: bool = True
+
+    def budget(self) -> int:
+        """Returns the character budget of a tool output, roughly 4 characters per token."""
+        if self.max_tokens is None:
+            return self.max_chars
+        return min(self.max_chars, self.max_tokens * 4)
+
+    def restrictor(self, engine: str) -> str | None:
+        """Returns the SerpAPI `json_restrictor` of the sections read from responses of the engine."""
+
+        if not self.restrict_responses:
+            return None
+        # Keep the error and status of the search, so failures are still reported
+        if engine == "google_shopping":
+            return "search_metadata,error,shopping_results,filters"
+        if engine == "google_product":
+            return ",".join(["search_metadata", "error", *self.details_fields])
+        return None
+
+
+class ProjectionStats(BaseModel):
+    """A class to count the size of tool outputs before and after projection."""
+
+    outputs: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+class Projector:
+    """A class to project results into compact, size-bounded tool outputs."""
+
+    _alias_prefix = "link_"
+    # Longest strings and lists kept, tried in turn when a single fragment is over the budget
+    _shortening = ((200, 5), (80, 3), (30, 2), (10, 1))
+
+    def __init__(self, projection: Projection = None, max_aliases: int = 10_000, measure: bool = None):
+        """Initializes the projector. With `measure` (tracing by default), `stats.bytes_in` counts the size
+        the results had before projection, which costs encoding them in full."""
+        self.projection = projection or Projection()
+        self.stats = ProjectionStats()
+        self.measure = measure
+        self.max_aliases = max_aliases
+        self._aliases: OrderedDict[str, str] = OrderedDict()
+        self._links: dict[str, str] = {}
+        self._next_alias = 0
+
+    def result(self, result: RemoteResult) -> str:
+        """Returns the compact tool output for the provided search or filter result."""
+
+        projection = self.projection
+
+        # Encode every product and filter once; trimming to the budget only drops encoded fragments
+        products = {i: json.dumps(self._pick(p, projection.product_fields)) for i, p in enumerate(result.products)}
+        # Products are dropped worst rank across the batch first, or last first when the batch wasn't merged
+        drops = sorted(products, key=lambda i: (result.products[i].get("rank") or 0, i))
+        filters = [
+            json.dumps(
+                {
+                    "type": f.type,
+                    "options": [self._pick(o, projection.option_fields) for o in f.options[: projection.filter_options]],
+                }
+            )
+            for f in result.filters
+        ]
+        extras = {}
+        if result.error:
+            extras["error"] = result.error
+        if result.duplicates:
+            extras["duplicates_removed"] = result.duplicates
+        if result.origin != "remote":
+            extras["origin"] = result.origin
+
+        head = f'{{"query": {json.dumps(self._alias(result.query))}, "products": ['
+        tail = "".join(f", {json.dumps(k)}: {json.dumps(v)}" for k, v in extras.items())
+
+        def _assemble() -> str:
+            output = head + ", ".join(products.values()) + '], "filters": [' + ", ".join(filters) + "]" + tail
+            if len(products) < len(result.products):
+                output += f', "omitted_products": {len(result.products) - len(products)}'
+            return output + "}"
+
+        # Drop filters, then the lowest ranked products, until the output fits the budget
+        budget = projection.budget()
+        output = _assemble()
+        while len(output) > budget and (filters or len(products) > 1):
+            if filters:
+                filters.pop()
+            else:
+                del products[drops.pop()]
+            output = _assemble()
+
+        # Then cut the long strings of the product left, or leave it out
+        for limits in self._shortening:
+            if len(output) <= budget or not products:
+                break
+            last = next(iter(products))
+            products[last] = json.dumps(self._shorten(json.loads(products[last]), *limits))
+            output = _assemble()
+        if len(output) > budget and products:
+            products.clear()
+            output = _assemble()
+        if len(output) > budget:
+            # Only a very long query and error are left to cut
+            head = f'{{"query": {json.dumps(self._truncate(result.query, 100))}, "products": ['
+            output = _assemble()
+        if len(output) > budget and "error" in extras:
+            # Leave room for the escaped ellipsis
+            extras["error"] = self._truncate(result.error, max(20, len(result.error) - (len(output) - budget) - 6))
+            tail = "".join(f", {json.dumps(k)}: {json.dumps(v)}" for k, v in extras.items())
+            output = _assemble()
+
+        return self._measure(result.to_string, output)
+
+    def details(self, details: dict) -> str:
+        """Returns the compact tool output for the provided product details."""
+
+        projection = self.projection
+        sections = {
+            k: json.dumps(self._compact(details[k])) for k in projection.details_fields if k in details
+        }
+
+        def _assemble() -> str:
+            return "{" + ", ".join(f"{json.dumps(k)}: {v}" for k, v in sections.items()) + "}"
+
+        # Drop the least important sections until the output fits the budget
+        budget = projection.budget()
+        output = _assemble()
+        while len(output) > budget and len(sections) > 1:
+            sections.pop(next(reversed(sections)))
+            output = _assemble()
+
+        # Then cut the long strings and lists of the section left, or leave it out
+        for limits in self._shortening:
+            if len(output) <= budget or not sections:
+                break
+            name = next(iter(sections))
+            sections[name] = json.dumps(self._shorten(json.loads(sections[name]), *limits))
+            output = _assemble()
+        if len(output) > budget:
+            sections.clear()
+            sections["truncated"] = "true"
+            output = _assemble()
+
+        return self._measure(lambda: json.dumps(details), output)
+
+    def expand(self, link: str) -> str:
+        """Returns the original link for the provided alias, or the link itself."""
+
+        link = link.strip()
+        if not link.startswith(self._alias_prefix):
+            return link
+
+        original = self._aliases.get(link)
+        if original is None:
+            raise ValueError(f"Unknown or expired link alias: {link}")
+        self._aliases.move_to_end(link)
+        return original
+
+    def scoped(self) -> "Projector":
+        """Returns a projector with its own link aliases, sharing this one's projection and stats.
+
+        Every session gets one, so the traffic of other sessions never evicts the aliases it handed out.
+        """
+
+        projector = Projector(self.projection, max_aliases=self.max_aliases, measure=self.measure)
+        projector.stats = self.stats
+        return projector
+
+    def _pick(self, value: dict, fields: list[str]) -> dict:
+        return {k: self._compact(value[k]) for k in fields if k in value}
+
+    def _compact(self, value):
+        """Recursively drops heavy fields, caps lists and aliases SERP API links."""
+
+        projection = self.projection
+        if isinstance(value, dict):
+            return {
+                k: self._compact(v) for k, v in value.items() if k not in projection.dropped_fields
+            }
+        if isinstance(value, list):
+            return [self._compact(v) for v in value[: projection.max_list_items]]
+        if isinstance(value, str):
+            return self._alias(value)
+        return value
+
+    def _alias(self, value: str) -> str:
+        """Returns a short alias for SERP API links, which are re-expanded server-side."""
+
+        if not self.projection.alias_links or not value.startswith("https://serpapi.com/"):
+            return value
+
+        alias = self._links.get(value)
+        if alias is not None:
+            self._aliases.move_to_end(alias)
+        else:
+            alias = f"{self._alias_prefix}{self._next_alias}"
+            self._next_alias += 1
+            self._links[value] = alias
+            self._aliases[alias] = value
+
+            # Forget the least recently used aliases
+            while len(self._aliases) > self.max_aliases:
+                _, link = self._aliases.popitem(last=False)
+                self._links.pop(link, None)
+
+        return alias
+
+    @classmethod
+    def _shorten(cls, value, max_chars: int, max_items: int):
+        """Returns the value with every string and list cut to the provided lengths."""
+
+        if isinstance(value, dict):
+            return {k: cls._shorten(v, max_chars, max_items) for k, v in value.items()}
+        if isinstance(value, list):
+            return [cls._shorten(v, max_chars, max_items) for v in value[:max_items]]
+        if isinstance(value, str):
+            return cls._truncate(value, max_chars)
+        return value
+
+    @staticmethod
+    def _truncate(value: str, max_chars: int) -> str:
+        return value if len(value) <= max_chars else value[: max_chars - 1] + "…"
+
+    def _measure(self, original: callable, output: str) -> str:
+        """Counts the output, and the size of the `original` payload when measuring is enabled."""
+
+        self.stats.outputs += 1
+        self.stats.bytes_out += len(output)
+        if self.measure if self.measure is not None else tracer.enabled:
+            size = len(original())
+            self.stats.bytes_in += size
+            log(lambda: f"Projected tool output: {size} -> {len(output)} bytes")
+        return output
+
+    def __str__(self):
+        return self.__class__.__name__
+
+# Failures of a single dispatch that are reported to the assistant instead of aborting the run.
+REMOTE_ERRORS = (NoResultsError, RemoteServiceError, CircuitOpenError, httpx.HTTPError)
+
+
 class Dispatcher:
     """A class to dispatch queries to remote services."""
 
-    def __init__(self):
-        """Initializes the Dispatcher object."""
-        pass 
+    def __init__(
+        self,
+        cache: ResponseCache | bool = True,
+        backend: SearchBackend = None,
+        loop: EventLoopThread = None,
+        projection: Projection = None,
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        local_filters: LocalFilterEngine | bool = True,
+        hedge: HedgePolicy = None,
+        catalog: ProductCatalog | bool = True,
+    ):
+        """Initializes the Dispatcher object. Pass `cache=False` to disable response caching,
+        and `local_filters=False` to send every filter link to the remote service. A `hedge` policy
+        (or SERP_HEDGE_PERCENTILE) races a duplicate request once the first one is unusually slow.
+        The `catalog` (SHOPPY_CATALOG_PATH by default) keeps every product seen, for local candidates."""
+        if cache is True:
+            cache = default_cache()
+        elif cache is False:
+            cache = None
+        self.cache: ResponseCache | None = cache
+        self.loop = loop or background_loop()
+        self.backend = backend or default_backend()
+        self.rate_limiter = rate_limiter or RateLimiter(qps=float(os.getenv("SERP_API_QPS", 10)))
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge or HedgePolicy.from_env()
+        self.projector = Projector(projection)
+        if local_filters is True:
+            local_filters = LocalFilterEngine()
+        self.local_filters: LocalFilterEngine | None = local_filters or None
+        if catalog is True:
+            catalog = ProductCatalog.from_env()
+        elif catalog is False:
+            catalog = None
+        self.catalog: ProductCatalog | None = catalog
+        self.coalesced = 0
+        self.duplicates_removed = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+
+    # MARK - Sync API
 
     def search(self, queries: list[SearchQuery]) -> list[RemoteResult]:
         """Returns a list of filtered results based on the provided query."""
+        return self.loop.run(self.asearch(queries))
 
-        async def _search(query: SearchQuery) -> RemoteResult:
-            # Get search parameters
-            params = self._search_params(query=query.text)
+    def filter(self, link: str) -> RemoteResult:
+        """Returns a list of filtered results based on the provided link."""
+        return self.loop.run(self.afilter(link))
 
-            # Dispatch the search
-            results = await asyncio.to_thread(self._dispatch, params)
+    def details(self, link: str) -> dict:
+        """Returns the product details for the provided link."""
+        return self.loop.run(self.adetails(link))
 
-            # Extract filters
-            filters = self._extract_filters(filters=results.get("filters"))
+    def close(self) -> None:
+        """Closes the backend and its pooled HTTP connections."""
+        self.loop.run(self.aclose())
 
-            # Extract results
-            products = self._extract_products(products=results.get("shopping_results"))
+    # MARK - Async API
 
-            log(lambda: f"Extracted results: {[p.get('title') for p in products]}")
-            log(lambda: f"Filter Options: {[f.type for f in filters]}")
-            return RemoteResult(id=query.id, query=query.text, products=products, filters=filters)
-        
-        async def _run_searches():
-            return await asyncio.gather(*[_search(query) for query in queries])
+    async def asearch(self, queries: list[SearchQuery]) -> list[RemoteResult]:
+        """Returns a list of filtered results based on the provided query. A failed query yields a result with an error."""
 
-        # Run the searches in parallel
-        results = asyncio.run(_run_searches())
-        return results
+        # Run the searches in parallel; one failure must not abort the others
+        return await asyncio.gather(*[self._search(query) for query in queries])
 
-    def filter(self, link: str) -> RemoteResult:
-        """Returns a list of filtered results based on the provided link."""
+    async def acandidates(self, query: str) -> RemoteResult | None:
+        """Returns the catalog's products matching the query, served locally while the search runs, if any."""
 
-        # Extract params from link (its a url)
-        parsed = urlparse(link)
-        params = parse_qs(parsed.query)
-        params_dict = {k: v[0] for k, v in params.items()}
-        
-        serp_api_key = os.getenv("SERP_API_KEY")
-        if not serp_api_key:
-            raise ValueError("SERP_API_KEY environment variable is not set.")
+        if self.catalog is None:
+            return None
 
-        params_dict["api_key"] = serp_api_key
+        # The catalog reads from disk, so keep it off the loop every session shares
+        products = await asyncio.to_thread(self.catalog.search, query)
+        if not products:
+            return None
+        return RemoteResult.model_construct(id="", query=query, products=products, filters=[], origin="catalog")
 
-        # Dispatch the search
-        results = self._dispatch(params=params_dict)
+    async def _search(self, query: SearchQuery) -> RemoteResult:
+        """Returns the result of a single query, or a result with an error if it failed."""
+
+        # Get search parameters
+        params = self._search_params(query=query.text)
+
+        try:
+            # Dispatch the search
+            results = await self._dispatch(params)
+        except REMOTE_ERRORS as error:
+            log(lambda: f"Search failed for {query.text}: {error}", level=WARNING)
+            # Fall back to the products the catalog knows, flagged as such
+            fallback = await self.acandidates(query.text)
+            if fallback is not None:
+                fallback.id, fallback.error = query.id, str(error)
+                return fallback
+            return RemoteResult.model_construct(id=query.id, query=query.text, products=[], filters=[], error=str(error))
+
+        # Keep every product, so follow-up filters can be answered without another request
+        if self.local_filters is not None:
+            self.local_filters.remember(params, results)
+        if self.catalog is not None:
+            self.catalog.upsert(results.get("shopping_results") or [])
 
         # Extract filters
         filters = self._extract_filters(filters=results.get("filters"))
@@ -98,57 +454,236 @@ class Dispatcher:
         # Extract results
         products = self._extract_products(products=results.get("shopping_results"))
 
-        log(lambda: f"Extracted results: {[p.get("title") for p in products]}")
+        log(lambda: f"Extracted results: {[p.get('title') for p in products]}")
         log(lambda: f"Filter Options: {[f.type for f in filters]}")
-        return RemoteResult(id="", query=link, products=products, filters=filters)
+        return RemoteResult.model_construct(id=query.id, query=query.text, products=products, filters=filters)
 
-    def details(self, link: str) -> dict:
+    async def afilter(self, link: str) -> RemoteResult:
         """Returns a list of filtered results based on the provided link."""
 
-        # Extract params from link (its a url)
-        parsed = urlparse(link)
-        params = parse_qs(parsed.query)
-        params_dict = {k: v[0] for k, v in params.items()}
-        
-        serp_api_key = os.getenv("SERP_API_KEY")
-        if not serp_api_key:
-            raise ValueError("SERP_API_KEY environment variable is not set.")
+        params = self._link_params(link)
+
+        # Filter the products of the search already made when possible, or dispatch the search
+        results = self.local_filters.apply(params) if self.local_filters is not None else None
+        origin = "remote" if results is None else "local"
+        tracer.increment("dispatch.filters", origin=origin)
+        if results is None:
+            results = await self._dispatch(params)
+            if self.catalog is not None:
+                self.catalog.upsert(results.get("shopping_results") or [])
+
+        # Extract filters
+        filters = self._extract_filters(filters=results.get("filters"))
+
+        # Extract results
+        products = self._extract_products(products=results.get("shopping_results"))
 
-        params_dict["api_key"] = serp_api_key
+        log(lambda: f"Extracted results: {[p.get('title') for p in products]}")
+        log(lambda: f"Filter Options: {[f.type for f in filters]}")
+        return RemoteResult.model_construct(id="", query=link, products=products, filters=filters, origin=origin)
+
+    async def adetails(self, link: str) -> dict:
+        """Returns the product details for the provided link."""
 
         # Dispatch the search
-        results = self._dispatch(params=params_dict)
-        
-        # Remove unnecessary fields
-        results.pop("search_parameters", None)
-        results.pop("search_metadata", None)
+        params = self._link_params(link)
+        results = await self._dispatch(params=params)
+
+        # Remove unnecessary fields, without mutating the shared response
+        results = {
+            k: v for k, v in results.items() if k not in ("search_parameters", "search_metadata")
+        }
 
-        log(lambda: f"Extracted results: {results.get('product_results').get("title")}")
+        if self.catalog is not None and params.get("product_id"):
+            self.catalog.upsert_details(params["product_id"], results)
+
+        log(lambda: f"Extracted results: {results.get('product_results').get('title')}")
         # Extract results
         return results
 
-    def _dispatch(self, params: dict) -> dict:
+    def merge(self, results: list[RemoteResult]) -> MergedResults:
+        """Returns the results with the products found by several of them kept in only one, ranked across the batch."""
+
+        deduplicated = merge_results(results)
+        merged = MergedResults.model_construct(
+            results=deduplicated, duplicates=sum(result.duplicates for result in deduplicated)
+        )
+        if merged.duplicates:
+            self.duplicates_removed += merged.duplicates
+            tracer.increment("merge.duplicates", merged.duplicates)
+            log(lambda: f"Removed {merged.duplicates} duplicate products across {len(results)} results")
+        return merged
+
+    async def aclose(self) -> None:
+        """Closes the backend and its pooled HTTP connections, and stores the catalog's pending writes."""
+        await self.loop.call(self.backend.aclose())
+        if self.catalog is not None:
+            await asyncio.to_thread(self.catalog.close)
+
+    async def _dispatch(self, params: dict) -> dict:
         """Dispatches the provided parameters to the remote service."""
 
-        # Request SERP API
-        search = GoogleSearch(params)
-        results = search.get_json()
+        restrictor = self.projector.projection.restrictor(params.get("engine"))
+        if restrictor:
+            params = {**params, "json_restrictor": restrictor}
+
+        with tracer.span("dispatch", engine=params.get("engine"), backend=str(self.backend)) as span:
+            # Serve repeated requests from the cache
+            if self.cache is not None:
+                cached = await self.cache.aget(params)
+                if cached is not None:
+                    span.label(cache="hit")
+                    # Only the counters: the cache size may take a query
+                    log(lambda: f"Cache hit: {params.get('engine')} ({self.cache.hits} hits, {self.cache.misses} misses)")
+                    return cached
+
+            span.label(cache="miss" if self.cache is not None else "off")
+
+            # Request the backend on the dispatcher loop, where the connection pool lives
+            return await self.loop.call(self._coalesce(params))
+
+    async def _coalesce(self, params: dict) -> dict:
+        """Joins the in-flight request for identical parameters, or starts a new one."""
+
+        key = cache_key(params)
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(params))
+            self._inflight[key] = task
+
+            def _done(_):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+            task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+            tracer.increment("dispatch.coalesced", engine=params.get("engine"))
+            log(lambda: f"Coalesced request: {params.get('engine')} ({self.coalesced} total)")
+
+        # A cancelled caller must not cancel the request shared with the others
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Abandon the request once nobody is waiting on it any more
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _fetch(self, params: dict) -> dict:
+        """Fetches and caches the response, retrying transient failures with jittered backoff."""
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before()
+
+            try:
+                async with self.rate_limiter:
+                    results = await self._request(params)
+            except Exception as error:
+                if not self.retry.is_retryable(error):
+                    self.breaker.record_success()
+                    raise
+
+                self.breaker.record_failure()
+                if getattr(error, "status", None) == 429:
+                    self.rate_limiter.penalize()
+
+                if attempt >= self.retry.max_attempts:
+                    raise
+
+                tracer.increment("dispatch.retries", engine=params.get("engine"))
+                delay = self.retry.delay(attempt, error)
+                log(lambda: f"Retrying {params.get('engine')} in {delay:.2f}s after: {error!r}", level=WARNING)
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.rate_limiter.reward()
+            break
 
         error = results.get("error")
         if error:
             raise NoResultsError(error)
 
+        if self.cache is not None:
+            await self.cache.aset(params, results)
+
         return results
 
-    def _search_params(self, query: str) -> dict:
-        """Returns the parameters for the remote service based on the provided query."""
-        serp_api_key = os.getenv("SERP_API_KEY")
+    async def _request(self, params: dict) -> dict:
+        """Requests the backend, racing a duplicate request once the first one is slower than usual."""
+
+        primary = asyncio.ensure_future(self.backend.fetch(params))
+        if self.hedge is None:
+            return await primary
+
+        started = time.monotonic()
+
+        def _observe(request: asyncio.Future) -> None:
+            # Only the primary's latency counts: the faster of two requests would pull the percentile down.
+            # A primary cancelled because its duplicate won took at least this long.
+            if request.cancelled() or request.exception() is None:
+                self.hedge.observe(time.monotonic() - started)
+
+        primary.add_done_callback(_observe)
+        delay = self.hedge.delay()
+        if delay is None:
+            return await primary
+        return await self._hedged(params, primary, delay)
+
+    async def _hedged(self, params: dict, primary: asyncio.Future, delay: float) -> dict:
+        """Returns the first successful response of the primary request and, past the delay, its duplicate."""
+
+        async def _duplicate() -> dict:
+            async with self.rate_limiter:
+                return await self.backend.fetch(params)
+
+        requests = {primary}
+        try:
+            done, _ = await asyncio.wait(requests, timeout=delay)
+            if not done:
+                self.hedge.hedged += 1
+                tracer.increment("dispatch.hedges", engine=params.get("engine"))
+                log(lambda: f"Hedging {params.get('engine')} after {delay:.2f}s")
+                duplicate = asyncio.ensure_future(_duplicate())
+                requests.add(duplicate)
+
+            # Take the first success; a failure only counts once every request has failed
+            while True:
+                done, _ = await asyncio.wait(requests, return_when=asyncio.FIRST_COMPLETED)
+                for request in done:
+                    requests.discard(request)
+                    if request.exception() is None:
+                        if request is not primary:
+                            self.hedge.wins += 1
+                            tracer.increment("dispatch.hedge_wins", engine=params.get("engine"))
+                        return request.result()
+                    if not requests:
+                        raise request.exception()
+        finally:
+            for request in requests:
+                request.cancel()
+
+    def _link_params(self, link: str) -> dict:
+        """Returns the request parameters encoded in the provided SERP API link."""
+
+        # Extract params from link (its a url, or an alias of one)
+        parsed = urlparse(self.projector.expand(link))
+        params = parse_qs(parsed.query)
+        return {k: v[0] for k, v in params.items()}
 
-        if not serp_api_key:
-            raise ValueError("SERP_API_KEY environment variable is not set.")
+    def _search_params(self, query: str) -> dict:
+        """Returns the parameters for the remote service based on the provided query. The backend adds its credentials."""
 
         return {
-            "api_key": serp_api_key,
             "engine": "google_shopping",
             "q": query,
             "location": "New York, United States",
@@ -161,16 +696,18 @@ class Dispatcher:
     def _extract_filters(self, filters: list[dict]) -> list[Filter]:
         """Returns a list of Filter objects based on the provided filters."""
 
-        # If a filter does not have a type, mark it as "default".
-        for f in filters:
-            if not f.get("type"):
-                f["type"] = "default"
+        if not filters:
+            return []
 
-        return [Filter(**f) for f in filters]
+        # If a filter does not have a type, mark it as "default". The response is trusted, so skip validation.
+        return [Filter.model_construct(type=f.get("type") or "default", options=f.get("options") or []) for f in filters]
 
     def _extract_products(self, products: list[dict]) -> list[dict]:
         """Returns a list of the top 10 Product objects based on the provided products."""
 
+        # Products stay the decoded dicts: the projector, merge, local filters and catalog all read them
+        # by field, so typed records or raw JSON fragments would only move the decoding elsewhere.
+
         if not products:
             return []
 
@@ -178,3 +715,4 @@ class Dispatcher:
 
     def __str__(self):
         return self.__class__.__name__
+
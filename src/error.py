@@ -1,4 +1,9 @@
-__all__ = ["NoResultsError"]
+__all__ = [
+    "NoResultsError",
+    "MaxRoundsExceededError",
+    "RemoteServiceError",
+    "CircuitOpenError",
+]
 
 
 class NoResultsError(Exception):
@@ -6,3 +11,33 @@ class NoResultsError(Exception):
     def __init__(self, message="No results found."):
         self.message = message
         super().__init__(self.message)
+
+
+class MaxRoundsExceededError(Exception):
+
+    def __init__(self, max_rounds: int):
+        self.message = f"The run exceeded {max_rounds} tool rounds."
+        super().__init__(self.message)
+
+
+class RemoteServiceError(Exception):
+
+    def __init__(
+        self,
+        message="The remote service failed.",
+        status: int = None,
+        retryable: bool = False,
+        retry_after: float = None,
+    ):
+        self.message = message
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, message="The remote service is unavailable; failing fast."):
+        self.message = message
+        super().__init__(self.message)
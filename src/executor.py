@@ -0,0 +1,221 @@
+import os, json, time, asyncio
+from typing import AsyncIterator
+from pydantic import BaseModel
+from openai.types.beta.threads.runs import ToolCall
+from .dispatch import REMOTE_ERRORS, Dispatcher, RemoteResult, SearchQuery
+from .merge import product_keys
+from .prefetch import DetailPrefetcher
+from .tracing import tracer
+from .utils import WARNING, log
+
+__all__ = ["ToolExecutor", "ToolOutput"]
+
+
+class ToolOutput(BaseModel):
+    """A class to represent the output of a single tool call."""
+
+    tool_call_id: str
+    output: str
+    products: list[dict]
+    result: RemoteResult | None = None
+    # False for the catalog's candidates, shown while the call itself is still running
+    final: bool = True
+
+    def to_submission(self) -> dict:
+        return {"tool_call_id": self.tool_call_id, "output": self.output}
+
+
+class ToolExecutor:
+    """A class to execute the assistant's tool calls concurrently."""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        on_product_list: callable,
+        max_concurrency: int = 8,
+        prefetcher: DetailPrefetcher = None,
+        tool_timeout: float = None,
+    ):
+        """Initializes the executor. `tool_timeout` (or SHOPPY_TOOL_TIMEOUT) bounds each round of tool calls, in seconds."""
+        self.dispatcher = dispatcher
+        self.on_product_list = on_product_list
+        self.max_concurrency = max_concurrency
+        self.prefetcher = prefetcher
+        self.tool_timeout = tool_timeout or float(os.getenv("SHOPPY_TOOL_TIMEOUT") or 0) or None
+        # The links aliased in this session's outputs, expanded before they reach the dispatcher
+        self.projector = dispatcher.projector.scoped()
+
+    def execute(self, tool_calls: list[ToolCall], deadline: float = None) -> list[dict]:
+        """Runs every tool call concurrently and returns the tool outputs in tool call order.
+
+        Products are handed to `on_product_list` as soon as the call that found them completes,
+        skipping the ones an earlier call of the round already delivered. The catalog's candidates
+        are handed over first, and their remote copies again once the search completes. Calls still running at
+        the `deadline` (a `time.monotonic()` value) are cancelled and answered with a timeout.
+        """
+
+        if self.tool_timeout:
+            round_deadline = time.monotonic() + self.tool_timeout
+            deadline = min(deadline, round_deadline) if deadline is not None else round_deadline
+
+        # Keys delivered by completed calls, and by the catalog's candidates shown meanwhile
+        seen: set[tuple] = set()
+        candidates: set[tuple] = set()
+        outputs: dict[str, ToolOutput] = {}
+        for output in self.dispatcher.loop.iterate(self.aexecute_iter(tool_calls, deadline)):
+            products = []
+            if output.final:
+                outputs[output.tool_call_id] = output
+
+                # Remote products are delivered even when a candidate showed them, so they replace its stale copy
+                for product in output.products:
+                    keys = product_keys(product)
+                    if output.result is None or not seen.intersection(keys):
+                        products.append(product)
+                    seen.update(keys)
+            else:
+                for product in output.products:
+                    keys = product_keys(product)
+                    if not seen.intersection(keys) and not candidates.intersection(keys):
+                        products.append(product)
+                    candidates.update(keys)
+
+            if products:
+                self.on_product_list(products)
+
+        outputs = self._merge([outputs[tool_call.id] for tool_call in tool_calls])
+        return [output.to_submission() for output in outputs]
+
+    async def aexecute_iter(self, tool_calls: list[ToolCall], deadline: float = None) -> AsyncIterator[ToolOutput]:
+        """Runs every tool call concurrently, at most `max_concurrency` at a time, yielding outputs as they complete.
+
+        Search and filter outputs are left unprojected until the whole round is merged. When the dispatcher
+        has a catalog, the local candidates of each search are yielded first, as outputs that aren't `final`.
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _run(tool_call: ToolCall) -> ToolOutput:
+            async with semaphore:
+                try:
+                    with tracer.span("tool_call", function=tool_call.function.name):
+                        if deadline is None:
+                            return await self._call(tool_call)
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError()
+                        return await asyncio.wait_for(self._call(tool_call), remaining)
+                except asyncio.TimeoutError:
+                    # Answer what is known so far; the abandoned request is cancelled unless another call shares it
+                    log(lambda: f"Tool call {tool_call.id} missed the deadline", level=WARNING)
+                    tracer.increment("tool_call.timeouts", function=tool_call.function.name)
+                    return self._timeout(tool_call)
+                except (*REMOTE_ERRORS, ValueError) as error:
+                    # Let the assistant know the call failed, or was made with bad arguments, instead of
+                    # aborting the whole round
+                    log(lambda: f"Tool call {tool_call.id} failed: {error!r}", level=WARNING)
+                    output = json.dumps({"error": str(error) or error.__class__.__name__})
+                    return ToolOutput(tool_call_id=tool_call.id, output=output, products=[])
+
+        # Start the calls before looking up their candidates, so the catalog never delays them
+        tasks = [asyncio.ensure_future(_run(tool_call)) for tool_call in tool_calls]
+        try:
+            lookups = await asyncio.gather(*[self._candidates(tool_call) for tool_call in tool_calls])
+            for tool_call, candidates in zip(tool_calls, lookups):
+                if candidates is not None:
+                    yield ToolOutput(
+                        tool_call_id=tool_call.id, output="", products=candidates.products, result=candidates, final=False
+                    )
+
+            for call in asyncio.as_completed(tasks):
+                yield await call
+        finally:
+            # The caller stopped listening: don't leave the calls running
+            for task in tasks:
+                task.cancel()
+
+    async def _call(self, tool_call: ToolCall) -> ToolOutput:
+        """Executes a single tool call against the dispatcher."""
+
+        name = tool_call.function.name
+        arguments = json.loads(tool_call.function.arguments)
+        log(lambda: f"Executing {name}: {arguments}")
+
+        if name == "execute_search":
+            query = arguments.get("query")
+            if not query:
+                raise ValueError("No query provided to search")
+
+            results = await self.dispatcher.asearch([SearchQuery(id=tool_call.id, text=query)])
+            result = results[0]
+            if self.prefetcher is not None:
+                self.prefetcher.schedule(result.products)
+            return ToolOutput(tool_call_id=tool_call.id, output="", products=result.products, result=result)
+
+        elif name == "filter_results":
+            link = arguments.get("serpapi_link")
+            if not link:
+                raise ValueError("No link provided to filter")
+
+            result = await self.dispatcher.afilter(self.projector.expand(link))
+            return ToolOutput(tool_call_id=tool_call.id, output="", products=result.products, result=result)
+
+        elif name == "get_product_details":
+            link = arguments.get("serpapi_product_api")
+            if not link:
+                raise ValueError("No link provided to get product details")
+            link = self.projector.expand(link)
+
+            product_details = None
+            if self.prefetcher is not None:
+                product_details = await self.prefetcher.get(link)
+            if product_details is None:
+                product_details = await self.dispatcher.adetails(link)
+            return ToolOutput(
+                tool_call_id=tool_call.id,
+                output=self.projector.details(product_details),
+                products=[product_details],
+            )
+
+        raise ValueError(f"Unknown tool: {name}")
+
+    async def _candidates(self, tool_call: ToolCall) -> RemoteResult | None:
+        """Returns the catalog's products for a search call, if any."""
+
+        if self.dispatcher.catalog is None or tool_call.function.name != "execute_search":
+            return None
+        try:
+            query = json.loads(tool_call.function.arguments).get("query")
+        except ValueError:
+            return None
+        return await self.dispatcher.acandidates(query) if query else None
+
+    @staticmethod
+    def _timeout(tool_call: ToolCall) -> ToolOutput:
+        """Returns the output of a call cancelled at the deadline, telling the assistant the results are partial."""
+
+        output = json.dumps(
+            {
+                "error": "timeout",
+                "message": f"{tool_call.function.name} did not finish within the turn's deadline",
+                "partial": True,
+            }
+        )
+        return ToolOutput(tool_call_id=tool_call.id, output=output, products=[])
+
+    def _merge(self, outputs: list[ToolOutput]) -> list[ToolOutput]:
+        """Removes the products found by several searches of the round and projects their outputs."""
+
+        pending = [output for output in outputs if output.result is not None]
+        if len(pending) > 1:
+            merged = self.dispatcher.merge([output.result for output in pending])
+            for output, result in zip(pending, merged.results):
+                output.result = result
+
+        for output in pending:
+            output.output = self.projector.result(output.result)
+
+        return outputs
+
+    def __str__(self):
+        return self.__class__.__name__
@@ -0,0 +1,171 @@
+import re, time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+from .cache import DEFAULT_TTLS, cache_key
+from .utils import log
+
+__all__ = ["LocalFilterEngine", "parse_tbs"]
+
+# Parameters that select the result set a filter applies to. Filter links only carry these and `tbs`.
+BASE_PARAMS = ("engine", "q")
+# Parameters that do not change which products are returned; the dispatcher searches in a single locale.
+NEUTRAL_PARAMS = {"api_key", "output", "source", "direct_link", "tbs", "location", "google_domain", "gl", "hl"}
+# Tokens that only mark the kind of filter, and restrict nothing themselves.
+MARKER_TOKENS = {"mr", "price", "cat"}
+
+
+def parse_tbs(tbs: str) -> dict[str, str]:
+    """Returns the `name: value` tokens of a `tbs` filter parameter, e.g. `mr:1,price:1,ppr_max:100`."""
+
+    tokens = {}
+    for token in tbs.split(","):
+        name, _, value = token.strip().partition(":")
+        if name:
+            tokens[name] = value
+    return tokens
+
+
+def _price(product: dict) -> float | None:
+    price = product.get("extracted_price")
+    if price is None and isinstance(product.get("price"), str):
+        match = re.search(r"[\d,]+(?:\.\d+)?", product["price"])
+        price = float(match.group().replace(",", "")) if match else None
+    return price
+
+
+def _on_sale(product: dict) -> bool:
+    if product.get("old_price") or product.get("extracted_old_price"):
+        return True
+    tag = str(product.get("tag") or "").lower()
+    return "sale" in tag or "% off" in tag
+
+
+class LocalFilterEngine:
+    """A class to answer filter links from the full product lists of searches already made.
+
+    Price ranges, on-sale, minimum rating, store and price or rating sorting are evaluated
+    locally; any other filter, or too few matching products, is left to the remote service.
+    """
+
+    def __init__(self, min_results: int = 5, max_entries: int = 64, ttl: float = DEFAULT_TTLS["google_shopping"]):
+        self.min_results = min_results
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.answered = 0
+        self.fallbacks = 0
+        self._results: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def remember(self, params: dict, response: dict) -> None:
+        """Keeps the full product list of an unfiltered search."""
+
+        if params.get("tbs") or not response.get("shopping_results"):
+            return
+
+        # Keep only the sections filters are evaluated against
+        response = {"shopping_results": response["shopping_results"], "filters": response.get("filters")}
+        key = self._key(params)
+        self._results.pop(key, None)
+        self._results[key] = (time.monotonic(), response)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def apply(self, params: dict) -> dict | None:
+        """Returns the response of the filter link if it can be answered locally, otherwise None."""
+
+        tokens = parse_tbs(params.get("tbs") or "")
+        unknown = [k for k in params if k not in BASE_PARAMS and k not in NEUTRAL_PARAMS]
+        if not tokens or unknown:
+            return self._fallback(params, f"unsupported parameters {unknown}")
+
+        response = self._base(params)
+        if response is None:
+            return self._fallback(params, "no unfiltered search to filter")
+
+        try:
+            products, sort = self._filter(response, tokens)
+        except LookupError as error:
+            return self._fallback(params, str(error))
+        except ValueError:
+            return self._fallback(params, "malformed filter")
+
+        if sort == "p":
+            products.sort(key=lambda p: _price(p) or float("inf"))
+        elif sort == "pd":
+            products.sort(key=lambda p: _price(p) or 0, reverse=True)
+        elif sort == "r":
+            products.sort(key=lambda p: float(p.get("rating") or 0), reverse=True)
+
+        # A sort alone never loses products; a restriction must leave enough of them
+        if len(products) < min(self.min_results, len(response["shopping_results"])):
+            return self._fallback(params, f"only {len(products)} local matches")
+
+        self.answered += 1
+        log(lambda: f"Filtered locally: {params.get('tbs')} ({len(products)} matches)")
+        return {"shopping_results": products, "filters": response.get("filters")}
+
+    def _filter(self, response: dict, tokens: dict[str, str]) -> tuple[list[dict], str | None]:
+        """Returns the products matching every token, and the sort order asked for."""
+
+        products = list(response["shopping_results"])
+        sort = None
+        for name, value in tokens.items():
+            if name in MARKER_TOKENS:
+                continue
+            elif name in ("ppr_min", "ppr_max"):
+                bound = float(value)
+                if name == "ppr_min":
+                    products = [p for p in products if (_price(p) or 0) >= bound]
+                else:
+                    products = [p for p in products if _price(p) is not None and _price(p) <= bound]
+            elif name == "sales":
+                products = [p for p in products if _on_sale(p)]
+            elif name == "avg_rating":
+                # Ratings are encoded in hundredths, e.g. avg_rating:400 is four stars and up
+                minimum = float(value) / 100
+                products = [p for p in products if float(p.get("rating") or 0) >= minimum]
+            elif name == "merchagg":
+                stores = self._stores(response, value)
+                if not stores:
+                    raise LookupError(f"unknown store {value}")
+                products = [p for p in products if str(p.get("source", "")).lower() in stores]
+            elif name == "p_ord" and value in ("p", "pd", "r"):
+                sort = value
+            else:
+                raise LookupError(f"unsupported filter {name}")
+
+        return products, sort
+
+    def _base(self, params: dict) -> dict | None:
+        entry = self._results.get(self._key(params))
+        if entry is None:
+            return None
+
+        remembered, response = entry
+        if time.monotonic() - remembered > self.ttl:
+            return None
+
+        return response
+
+    def _stores(self, response: dict, merchants: str) -> set[str]:
+        """Returns the names of the stores a `merchagg` token selects, from the filter options of the search."""
+
+        selected = set(merchants.split("|"))
+        stores = set()
+        for option in (o for f in response.get("filters") or [] for o in f.get("options") or []):
+            tbs = option.get("tbs")
+            if tbs is None:
+                tbs = parse_qs(urlparse(option.get("serpapi_link") or "").query).get("tbs", [""])[0]
+            if selected & set(parse_tbs(tbs).get("merchagg", "").split("|")):
+                stores.add(str(option.get("text", "")).lower())
+        return stores
+
+    def _fallback(self, params: dict, reason: str) -> None:
+        self.fallbacks += 1
+        log(lambda: f"Filtering remotely ({reason}): {params.get('tbs')}")
+        return None
+
+    def _key(self, params: dict) -> str:
+        return cache_key({k: params.get(k) for k in BASE_PARAMS})
+
+    def __str__(self):
+        return self.__class__.__name__
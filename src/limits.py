@@ -0,0 +1,190 @@
+import os, time, random, asyncio
+from collections import deque
+import httpx
+from .error import CircuitOpenError, RemoteServiceError
+from .utils import WARNING, log
+
+__all__ = ["RateLimiter", "RetryPolicy", "CircuitBreaker", "HedgePolicy"]
+
+
+class RateLimiter:
+    """An adaptive token-bucket rate limiter that also bounds concurrent requests."""
+
+    def __init__(
+        self,
+        qps: float = 10.0,
+        burst: int = None,
+        max_concurrency: int = 10,
+        min_qps: float = 0.5,
+    ):
+        self.qps = qps
+        self.max_qps = qps
+        self.min_qps = min_qps
+        self.capacity = burst or max(1, int(qps))
+        self.tokens = float(self.capacity)
+        self.max_concurrency = max_concurrency
+        self._updated = time.monotonic()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Waits for a free request slot and a token."""
+
+        await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                while True:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.qps)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self) -> None:
+        """Frees the request slot."""
+        self._semaphore.release()
+
+    def penalize(self) -> None:
+        """Halves the rate after the remote service pushed back."""
+        self._refill()
+        self.qps = max(self.min_qps, self.qps / 2)
+        log(lambda: f"Rate limited; slowing down to {self.qps:.2f} qps", level=WARNING)
+
+    def reward(self) -> None:
+        """Recovers the rate gradually after a successful request."""
+        if self.qps < self.max_qps:
+            self._refill()
+            self.qps = min(self.max_qps, self.qps + self.max_qps / 20)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.qps)
+        self._updated = now
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *_):
+        self.release()
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class RetryPolicy:
+    """A class to decide which failures are retried, and after how long."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Returns whether the failure is transient: timeouts, connection errors, 429s and 5xxs."""
+
+        if isinstance(error, RemoteServiceError):
+            return error.retryable
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+    def delay(self, attempt: int, error: Exception = None) -> float:
+        """Returns the jittered exponential backoff before the next attempt."""
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class CircuitBreaker:
+    """A class to fail fast while the remote service is unhealthy."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.rejected = 0
+        self._trial_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before(self) -> None:
+        """Raises while the circuit is open; lets a trial request through once it is half open."""
+
+        state = self.state
+        now = time.monotonic()
+        trial_running = self._trial_at is not None and now - self._trial_at < self.reset_timeout
+
+        if state == "open" or (state == "half_open" and trial_running):
+            self.rejected += 1
+            raise CircuitOpenError()
+
+        if state == "half_open":
+            self._trial_at = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.failure_threshold:
+            log(lambda: f"Circuit opened after {self.failures} failures", level=WARNING)
+            self.opened_at = time.monotonic()
+        self._trial_at = None
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class HedgePolicy:
+    """A class to decide when a slow request gets a duplicate, from the latencies seen recently."""
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, min_delay: float = 0.25, window: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.hedged = 0
+        self.wins = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy | None":
+        """Returns a policy hedging past the SERP_HEDGE_PERCENTILE latency (e.g. 0.95), or None when unset."""
+
+        percentile = os.getenv("SERP_HEDGE_PERCENTILE")
+        if not percentile:
+            return None
+        return cls(percentile=float(percentile))
+
+    def observe(self, seconds: float) -> None:
+        """Records the latency of a completed request."""
+        self._latencies.append(seconds)
+
+    def delay(self) -> float | None:
+        """Returns how long to wait for a request before hedging it, or None until enough latencies were seen."""
+
+        if len(self._latencies) < self.min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return max(self.min_delay, latencies[index])
+
+    def __str__(self):
+        return self.__class__.__name__
@@ -0,0 +1,96 @@
+import queue, asyncio, threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator
+
+__all__ = ["EventLoopThread", "background_loop"]
+
+
+class EventLoopThread:
+    """A long-lived asyncio event loop running in a daemon thread."""
+
+    def __init__(self, name: str = "shoppy-loop"):
+        """Starts the event loop thread."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedules the coroutine on the loop and returns a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine) -> Any:
+        """Runs the coroutine on the loop and blocks the calling thread until it returns."""
+
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("Cannot block on the background loop from inside it.")
+
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            # Don't leave the work running on the loop once the caller gave up on it
+            future.cancel()
+            raise
+
+    def iterate(self, iterator: AsyncIterator) -> Iterator:
+        """Runs the async iterator on the loop and yields its items on the calling thread as they arrive."""
+
+        items = queue.SimpleQueue()
+        done = object()
+
+        async def _drain():
+            try:
+                async for item in iterator:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = self.submit(_drain())
+        try:
+            while (item := items.get()) is not done:
+                yield item
+        except (KeyboardInterrupt, GeneratorExit):
+            future.cancel()
+            raise
+
+        # Surface the iterator's exception, if any
+        future.result()
+
+    async def call(self, coro: Coroutine) -> Any:
+        """Awaits the coroutine on the loop from any running event loop."""
+
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def in_loop(self) -> bool:
+        """Returns whether the caller is running on the loop thread."""
+        return threading.current_thread() is self._thread
+
+    def stop(self) -> None:
+        """Stops the event loop and waits for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+_shared: EventLoopThread | None = None
+_shared_lock = threading.Lock()
+
+
+def background_loop() -> EventLoopThread:
+    """Returns the process-wide background event loop, starting it on first use."""
+
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EventLoopThread()
+        return _shared
@@ -0,0 +1,93 @@
+import re, math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .dispatch import RemoteResult
+
+__all__ = ["merge_results", "product_keys", "score"]
+
+# Products without a position are ranked as if they came last.
+MISSING_POSITION = 100
+
+
+def product_keys(product: dict) -> list[tuple]:
+    """Returns the keys a product is identified by: its product id and its normalized title and source."""
+
+    keys = []
+    product_id = product.get("product_id")
+    if product_id:
+        keys.append(("id", str(product_id)))
+
+    title = product.get("title")
+    if title:
+        title = re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+        source = (product.get("source") or "").strip().lower()
+        keys.append(("title", title, source))
+
+    return keys
+
+
+def score(product: dict) -> float:
+    """Returns the merged ranking score of a product; higher is better.
+
+    A product's position within its own query dominates, and well-reviewed products
+    are lifted by their rating weighted by the magnitude of their review count.
+    """
+
+    position = product.get("position") or MISSING_POSITION
+    try:
+        rating = float(product.get("rating") or 0)
+        reviews = int(product.get("reviews") or 0)
+    except (TypeError, ValueError):
+        rating, reviews = 0.0, 0
+
+    return 1 / position + rating / 5 * min(1.0, math.log10(1 + reviews) / 4)
+
+
+def merge_results(results: list["RemoteResult"]) -> list["RemoteResult"]:
+    """Removes the products found by several results from all but one of them.
+
+    Each product is kept in the result where it ranked best (earliest result on ties),
+    and every kept product is annotated with its `rank` across the whole batch.
+    """
+
+    # Group the products sharing any key, transitively: an id match and a title match join their groups
+    located = [(i, j, product) for i, result in enumerate(results) for j, product in enumerate(result.products)]
+    parents = list(range(len(located)))
+
+    def _root(node: int) -> int:
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    owners: dict[tuple, int] = {}
+    for node, (_, _, product) in enumerate(located):
+        for key in product_keys(product):
+            owner = owners.setdefault(key, node)
+            parents[_root(node)] = _root(owner)
+
+    groups: dict[int, list[tuple[int, int, dict]]] = {}
+    for node, candidate in enumerate(located):
+        groups.setdefault(_root(node), []).append(candidate)
+
+    # Keep the best placed copy of every product
+    kept: dict[tuple[int, int], dict] = {}
+    for group in groups.values():
+        i, j, product = min(group, key=lambda c: (c[2].get("position") or MISSING_POSITION, c[0], c[1]))
+        kept[(i, j)] = product
+
+    # Rank the kept products across the batch, without mutating the shared responses
+    ranked = sorted(kept.items(), key=lambda item: (-score(item[1]), item[0]))
+    ranks = {location: rank for rank, (location, _) in enumerate(ranked, start=1)}
+
+    merged = []
+    for i, result in enumerate(results):
+        products = [{**kept[(i, j)], "rank": ranks[(i, j)]} for j in range(len(result.products)) if (i, j) in kept]
+        merged.append(
+            result.model_copy(
+                update={"products": products, "duplicates": len(result.products) - len(products)}
+            )
+        )
+
+    return merged
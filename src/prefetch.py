@@ -0,0 +1,123 @@
+import os, asyncio
+from collections import OrderedDict
+from .cache import cache_key
+from .dispatch import REMOTE_ERRORS, Dispatcher
+from .tracing import tracer
+from .utils import log
+
+__all__ = ["DetailPrefetcher"]
+
+
+class DetailPrefetcher:
+    """A class to fetch the details of the top search results before the assistant asks for them."""
+
+    def __init__(self, dispatcher: Dispatcher, top_k: int = 3, budget: int = 30, max_entries: int = 64):
+        """Prefetches the details of the first `top_k` products of every search, at most `budget` times per session."""
+        self.dispatcher = dispatcher
+        self.top_k = top_k
+        self.budget = budget
+        self.max_entries = max_entries
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self._entries: OrderedDict[str, asyncio.Task] = OrderedDict()
+        self._used: set[str] = set()
+
+    @classmethod
+    def from_env(cls, dispatcher: Dispatcher) -> "DetailPrefetcher | None":
+        """Returns a prefetcher when SHOPPY_PREFETCH sets how many results to prefetch, and SHOPPY_PREFETCH_BUDGET how many per session."""
+
+        top_k = int(os.getenv("SHOPPY_PREFETCH") or 0)
+        if top_k <= 0:
+            return None
+        return cls(dispatcher, top_k=top_k, budget=int(os.getenv("SHOPPY_PREFETCH_BUDGET") or 30))
+
+    def schedule(self, products: list[dict]) -> None:
+        """Starts fetching the details of the top products in the background. Must be called on the dispatcher loop."""
+
+        ranked = sorted(products, key=lambda p: p.get("position") or len(products))
+        for product in ranked[: self.top_k]:
+            link = product.get("serpapi_product_api")
+            if not link or self._key(link) in self._entries:
+                continue
+            if self.prefetched >= self.budget:
+                log(lambda: f"Prefetch budget of {self.budget} spent")
+                return
+
+            self.prefetched += 1
+            tracer.increment("prefetch.requests")
+            task = asyncio.ensure_future(self.dispatcher.adetails(link))
+            # A failed prefetch is only reported to whoever asks for it
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._entries[self._key(link)] = task
+            self._evict()
+
+    async def get(self, link: str) -> dict | None:
+        """Returns the prefetched details of the link, or None if they were not prefetched or failed."""
+
+        link = self._key(link)
+        task = self._entries.get(link)
+        if task is None or task.cancelled():
+            self.misses += 1
+            tracer.increment("prefetch.misses")
+            return None
+
+        self.hits += 1
+        self._used.add(link)
+        self._entries.move_to_end(link)
+        tracer.increment("prefetch.hits")
+        log(lambda: f"Prefetch hit ({'ready' if task.done() else 'in flight'}): {link}")
+
+        try:
+            # Another caller giving up must not cancel the prefetch
+            return await asyncio.shield(task)
+        except REMOTE_ERRORS:
+            return None
+
+    def cancel(self) -> None:
+        """Cancels the prefetches still in flight and drops the unused ones, once the session has moved on.
+        Safe to call from any thread."""
+
+        def _cancel():
+            for link, task in list(self._entries.items()):
+                # Keep the details already asked for; the others count as wasted, finished or not
+                if task.done() and link in self._used:
+                    continue
+                task.cancel()
+                del self._entries[link]
+                self._discard(link)
+
+        self.dispatcher.loop.loop.call_soon_threadsafe(_cancel)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "wasted": self.wasted,
+            "budget_left": self.budget - self.prefetched,
+        }
+
+    def _key(self, link: str) -> str:
+        # Links are compared by the request they make, whether aliased or with their parameters reordered
+        return cache_key(self.dispatcher._link_params(link))
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            link, task = self._entries.popitem(last=False)
+            if not task.done():
+                task.cancel()
+            self._discard(link)
+
+    def _discard(self, link: str) -> None:
+        if link in self._used:
+            self._used.discard(link)
+        else:
+            self.wasted += 1
+            tracer.increment("prefetch.wasted")
+
+    def __str__(self):
+        return self.__class__.__name__
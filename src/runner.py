@@ -1,247 +1,327 @@
-import json
-from openai import OpenAI
-from typing_extensions import override
-from openai import AssistantEventHandler, OpenAI
-from openai.types.beta.threads import Text, TextDelta
-from openai.types.beta.threads.runs import ToolCall, ToolCallDelta
-from openai.types.beta.threads import Message, MessageDelta
-from openai.types.beta.threads.runs import ToolCall, RunStep
+import os, abc, time
+from openai import NOT_GIVEN, OpenAI, Stream
 from openai.types.beta import AssistantStreamEvent
-from .dispatch import Dispatcher, SearchQuery
-from .utils import log
+from openai.types.beta.threads import Message, MessageDeltaEvent, Run
+from openai.types.beta.threads.runs import RunStep
+from openai.types.beta.threads.required_action_function_tool_call import (
+    RequiredActionFunctionToolCall,
+)
+from pydantic import BaseModel
+from .context import ContextPolicy, ThreadContext
+from .dispatch import Dispatcher
+from .error import MaxRoundsExceededError
+from .executor import ToolExecutor
+from .prefetch import DetailPrefetcher
+from .tracing import tracer
+from .utils import INFO, WARNING, log
 
-__all__ = ["Runner"]
+__all__ = ["BaseRunner", "Runner", "RunStats"]
 
 
-class Runner:
+class RunStats(BaseModel):
+    """A class to count the API round trips made while running the assistant."""
 
-    _assistant_id = "asst_0ikYWUWwI9pm3wyousqovlNp"
+    api_calls: int = 0
+    tool_rounds: int = 0
+    tool_calls: int = 0
+    # One runs.retrieve per tool call used to be needed to learn the run status.
+    retrieves_saved: int = 0
+    tool_output_bytes: int = 0
+    thread_bytes: int = 0
+    rolled_over: bool = False
+
+
+class BaseRunner(abc.ABC):
+    """A base class holding what every runner shares: the tool executor, the context and the turn deadline.
+
+    Subclasses run one turn in `_start`.
+    """
+
+    # Labels of the spans and counters recorded for the runner
+    _labels: dict = {}
 
     def __init__(
         self,
         client: OpenAI,
         on_product_list: callable,
         on_text_changed: callable,
-        thread_id: str = None,
+        max_tool_concurrency: int = 8,
+        max_rounds: int = 10,
+        dispatcher: Dispatcher = None,
+        context: ContextPolicy = None,
+        prefetcher: DetailPrefetcher = None,
     ):
         self.client = client
-        self.dispatcher = Dispatcher()
+        self.dispatcher = dispatcher or Dispatcher()
+        self.context = ThreadContext(context or ContextPolicy.from_env())
+        self.executor = ToolExecutor(
+            dispatcher=self.dispatcher,
+            on_product_list=self._on_product_list,
+            max_concurrency=max_tool_concurrency,
+            prefetcher=prefetcher or DetailPrefetcher.from_env(self.dispatcher),
+        )
         self.on_product_list = on_product_list
         self.on_text_changed = on_text_changed
-        if not thread_id:
-            thread = self.client.beta.threads.create()
-            self.thread_id = thread.id
-        else:
-            self.thread_id = thread_id
+        self.max_rounds = max_rounds
+        self.stats = RunStats()
 
-    def start(self, query: str) -> None:
-        """Runs the assistant with the provided query."""
+    def prepare(self) -> None:
+        """Creates what the first query needs ahead of it, e.g. while the user is still typing it."""
+        pass
 
-        self.client.beta.threads.messages.create(
-            thread_id=self.thread_id,
-            role="user",
-            content=[
-                {
-                    "type": "text",
-                    "text": query,
-                },
-            ],
-        )
+    def start(self, query: str, timeout: float = None) -> None:
+        """Runs the assistant with the provided query.
 
-        event_handler = EventHandler(
-            client=self.client, 
-            dispatcher=self.dispatcher, 
-            thread_id=self.thread_id,
-            on_product_list=self.on_product_list,
-            on_text_changed=self.on_text_changed,
-        )
+        Tool calls still running `timeout` seconds (or SHOPPY_TURN_TIMEOUT) into the turn are cancelled,
+        and the assistant answers from the partial results.
+        """
 
-        # Create a new run
-        with self.client.beta.threads.runs.stream(
-            thread_id=self.thread_id,
-            assistant_id=self._assistant_id,
-            event_handler=event_handler,
-            parallel_tool_calls=True,
-        ) as stream:
-            stream.until_done()
+        timeout = timeout or float(os.getenv("SHOPPY_TURN_TIMEOUT") or 0)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        with tracer.span("runner.start", **self._labels):
+            self.stats = RunStats()
+            # Details still being prefetched for the previous turn are unlikely to be asked for now
+            if self.executor.prefetcher is not None:
+                self.executor.prefetcher.cancel()
+
+            self.context.begin_turn(query)
+            try:
+                self._start(query, deadline)
+            finally:
+                self.context.end_turn()
+
+        log(lambda: f"Run stats: {self.stats}", level=INFO)
+        if self.executor.prefetcher is not None:
+            log(lambda: f"Prefetch stats: {self.executor.prefetcher.stats()}", level=INFO)
+
+    @abc.abstractmethod
+    def _start(self, query: str, deadline: float = None) -> None:
+        """Runs one turn of the conversation, calling tools until the assistant answers."""
+
+    def _add_tool_outputs(self, tool_outputs: list[dict]) -> None:
+        """Records the outputs of a tool round in the context and the stats."""
+
+        self.context.add_tool_outputs(tool_outputs)
+        self.stats.tool_output_bytes += sum(len(o["output"].encode()) for o in tool_outputs)
+        self.stats.thread_bytes = self.context.tool_output_bytes
 
-        return
+    def _on_product_list(self, products: list[dict]) -> None:
+        self.context.add_products(products)
+        self.on_product_list(products)
 
+    def _on_text_changed(self, text: str) -> None:
+        self.context.add_text(text)
+        self.on_text_changed(text)
 
-class EventHandler(AssistantEventHandler):
-    """A class to handle assistant events."""
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class Runner(BaseRunner):
+    """A runner that keeps the conversation in an Assistants API thread and streams its runs."""
+
+    _assistant_id = "asst_0ikYWUWwI9pm3wyousqovlNp"
+    _stopped = ("cancelling", "cancelled", "completed", "failed", "expired", "incomplete")
 
     def __init__(
         self,
         client: OpenAI,
-        dispatcher: Dispatcher,
-        thread_id: str,
         on_product_list: callable,
         on_text_changed: callable,
+        thread_id: str = None,
+        max_tool_concurrency: int = 8,
+        max_rounds: int = 10,
+        dispatcher: Dispatcher = None,
+        context: ContextPolicy = None,
+        prefetcher: DetailPrefetcher = None,
     ):
-        super().__init__()
-        self.client = client
-        self.dispatcher = dispatcher
+        super().__init__(
+            client,
+            on_product_list,
+            on_text_changed,
+            max_tool_concurrency=max_tool_concurrency,
+            max_rounds=max_rounds,
+            dispatcher=dispatcher,
+            context=context,
+            prefetcher=prefetcher,
+        )
         self.thread_id = thread_id
-        self.run_id = None
-        self.run_step = None
-        self.non_search_tool_calls: list[ToolCall] = []
-        self.search_tool_calls: list[ToolCall] = []
-        self.on_product_list = on_product_list
-        self.on_text_changed = on_text_changed
+        self.event_handler = EventHandler(on_text_changed=self._on_text_changed)
 
-    @override
-    def on_end(self):
-        log(lambda: f"\n end assistant > {self.current_run_step_snapshot}")
-        return super().on_end()
-
-    @override
-    def on_exception(self, exception: Exception) -> None:
-        """Fired whenever an exception happens during streaming"""
-        log(lambda: f"\nassistant > {exception}\n")
-        return super().on_exception(exception)
-
-    @override
-    def on_tool_call_created(self, tool_call):
-        log(lambda: f"\nassistant on_tool_call_created > {tool_call}")
-        return super().on_tool_call_created(tool_call)
-
-    @override
-    def on_tool_call_done(self, tool_call: ToolCall) -> None:
-        log(lambda: f"\nassistant on_tool_call_done > {tool_call}")
-        keep_retrieving_run = self.client.beta.threads.runs.retrieve(
-            thread_id=self.thread_id, run_id=self.run_id
-        )
+    def prepare(self) -> None:
+        """Creates the thread ahead of the first query, e.g. while the user is still typing it."""
 
-        log(lambda: f"\run status: {keep_retrieving_run.status}")
-
-        if keep_retrieving_run.status == "completed":
-            return
-
-        elif keep_retrieving_run.status == "in_progress":
-
-            if tool_call.function.name == "execute_search":
-                self.search_tool_calls.append(tool_call)
-            else:
-                self.non_search_tool_calls.append(tool_call)
-
-        elif keep_retrieving_run.status == "requires_action":
-            if tool_call.function.name == "execute_search":
-                self.search_tool_calls.append(tool_call)
-            else:
-                self.non_search_tool_calls.append(tool_call)
-
-            tool_outputs = []
-
-            queries: list[SearchQuery] = []
-            for tool_call in self.search_tool_calls:
-                name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-
-                if name == "execute_search":
-                    query = arguments.get("query")
-                    if not query:
-                        raise ValueError("No query provided to search")
-
-                    queries.append(SearchQuery(id=tool_call.id, text=query))
-
-            if len(queries) > 0:
-                search_results = self.dispatcher.search(queries)
-
-                for result in search_results:
-                    tool_outputs.append(
-                        {
-                            "tool_call_id": result.id,
-                            "output": result.to_string(),
-                        }
-                    )
-                    self.on_product_list(result.products)
-
-            for tool_call in self.non_search_tool_calls:
-                name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-
-                if name == "filter_results":
-                    link = arguments.get("serpapi_link")
-                    if not link:
-                        raise ValueError("No link provided to filter")
-
-                    filter_results = self.dispatcher.filter(link)
-
-                    tool_outputs.append(
-                        {
-                            "tool_call_id": tool_call.id,
-                            "output": filter_results.to_string(),
-                        }
-                    )
-
-                    self.on_product_list(filter_results.products)
-
-                elif name == "get_product_details":
-                    link = arguments.get("serpapi_product_api")
-                    if not link:
-                        raise ValueError("No link provided to get product details")
-
-                    product_details = self.dispatcher.details(link)
-
-                    tool_outputs.append(
-                        {
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps(product_details),
-                        }
-                    )
-
-                    self.on_product_list([product_details])
-
-            event_handler = EventHandler(
-                client=self.client,
-                dispatcher=self.dispatcher,
-                thread_id=self.thread_id,
-                on_product_list=self.on_product_list,
-                on_text_changed=self.on_text_changed,
-            )
-
-            with self.client.beta.threads.runs.submit_tool_outputs_stream(
-                run_id=self.run_id,
-                thread_id=self.thread_id,
-                tool_outputs=tool_outputs,
-                event_handler=event_handler,
-            ) as stream:
-                stream.until_done()
-
-        return super().on_tool_call_done(tool_call)
-
-    @override
-    def on_run_step_created(self, run_step: RunStep) -> None:
-        log(lambda: f"on_run_step_created")
-        self.run_id = run_step.run_id
-        self.run_step = run_step
-        log(lambda: f"The type of run_step run step is {type(run_step)}")
-        log(lambda: f"\n run step created assistant > {run_step}\n")
-        return super().on_run_step_created(run_step)
-
-    @override
-    def on_run_step_done(self, run_step: RunStep) -> None:
-        log(lambda: f"\n run step done assistant > {run_step.id}\n")
-        return super().on_run_step_done(run_step)
+        if not self.thread_id:
+            self.thread_id = self.client.beta.threads.create().id
 
-    # MARK - Message and text events
+    def _start(self, query: str, deadline: float = None) -> None:
+        self.event_handler.begin_turn()
+
+        message = {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": query,
+                },
+            ],
+        }
+
+        if self.thread_id and self.context.should_roll_over():
+            # Continue in a fresh thread seeded with a summary, instead of an ever growing prompt
+            log(lambda: f"Rolling over thread {self.thread_id} at {self.context.tool_output_bytes} bytes", level=INFO)
+            summary = {"role": "assistant", "content": self.context.roll_over()}
+            self.thread_id = self.client.beta.threads.create(messages=[summary, message]).id
+            self.stats.api_calls += 1
+            self.stats.rolled_over = True
+            tracer.increment("runner.rollovers")
+        else:
+            # The thread is created on the first run, not when the runner is built
+            if not self.thread_id:
+                self.thread_id = self.client.beta.threads.create().id
+                self.stats.api_calls += 1
 
-    @override
-    def on_text_delta(self, delta: TextDelta, snapshot: Text) -> None:
-        self.on_text_changed(delta.value)
-        return super().on_text_delta(delta, snapshot)
+            self.client.beta.threads.messages.create(thread_id=self.thread_id, **message)
+            self.stats.api_calls += 1
 
-    @override
-    def on_message_delta(self, delta: MessageDelta, snapshot: Message) -> None:
-        return super().on_message_delta(delta, snapshot)
+        # Create a new run
+        self.event_handler.reset()
+        self.stats.api_calls += 1
+        stream = self.client.beta.threads.runs.create(
+            thread_id=self.thread_id,
+            assistant_id=self._assistant_id,
+            parallel_tool_calls=True,
+            truncation_strategy=self.context.policy.truncation_strategy() or NOT_GIVEN,
+            stream=True,
+        )
 
-    @override
-    def on_message_created(self, message: Message) -> None:
-        log(lambda: f"\nassistant on_message_created > {message}\n")
-        return super().on_message_created(message)
+        # Stream -> collect tool calls -> execute -> submit, until the run stops asking
+        try:
+            while True:
+                with tracer.span("runner.step", round=self.stats.tool_rounds):
+                    self.event_handler.consume(stream)
+
+                tool_calls = self.event_handler.tool_calls
+                if not tool_calls:
+                    break
+
+                run_id = self.event_handler.run.id
+                if self.stats.tool_rounds >= self.max_rounds:
+                    raise MaxRoundsExceededError(self.max_rounds)
+
+                self.stats.tool_rounds += 1
+                self.stats.tool_calls += len(tool_calls)
+                self.stats.retrieves_saved += len(tool_calls)
+
+                # Run every tool call of the step concurrently
+                with tracer.span("runner.tool_round"):
+                    tool_outputs = self.executor.execute(tool_calls, deadline)
+
+                self._add_tool_outputs(tool_outputs)
+
+                self.event_handler.reset()
+                self.stats.api_calls += 1
+                stream = self.client.beta.threads.runs.submit_tool_outputs(
+                    run_id=run_id,
+                    thread_id=self.thread_id,
+                    tool_outputs=tool_outputs,
+                    stream=True,
+                )
+        except BaseException:
+            # Stop the run server-side too, so the thread accepts the next message after an interrupt,
+            # a failed round or too many rounds
+            self._cancel_run()
+            raise
+
+    def _cancel_run(self) -> None:
+        """Cancels the run of the interrupted or failed turn, unless it already stopped."""
+
+        try:
+            run = self.event_handler.run or self.event_handler.last_run
+            if run is None or run.status in self._stopped:
+                # Interrupted before the stream named its run: look up the latest run of the thread
+                runs = self.client.beta.threads.runs.list(thread_id=self.thread_id, limit=1)
+                self.stats.api_calls += 1
+                run = runs.data[0] if runs.data else None
+            if run is None or run.status in self._stopped:
+                return
+
+            self.client.beta.threads.runs.cancel(run_id=run.id, thread_id=self.thread_id)
+            self.stats.api_calls += 1
+        except Exception as error:
+            log(lambda: f"Could not cancel the run of thread {self.thread_id}: {error!r}", level=WARNING)
+
+
+class EventHandler:
+    """A class to handle assistant stream events for every round of a run."""
+
+    def __init__(self, on_text_changed: callable):
+        self.on_text_changed = on_text_changed
+        self.run: Run | None = None
+        # The run of the previous round, kept across `reset()` to cancel it if the next round is interrupted
+        self.last_run: Run | None = None
+        self.tool_calls: list[RequiredActionFunctionToolCall] = []
+        self.turn_started: float | None = None
+
+    def begin_turn(self) -> None:
+        """Starts the clock for the time to first token of a new turn."""
+        self.turn_started = time.perf_counter()
+        self.last_run = None
+
+    def reset(self) -> None:
+        """Clears the state of the previous round."""
+        self.last_run = self.run or self.last_run
+        self.run = None
+        self.tool_calls = []
+
+    def consume(self, stream: Stream[AssistantStreamEvent]) -> None:
+        """Handles every event of the stream, then closes it."""
+
+        with stream:
+            for event in stream:
+                self.on_event(event)
+
+    def on_event(self, event: AssistantStreamEvent) -> None:
+        """Routes the stream event to its handler."""
+
+        if event.event == "thread.message.delta":
+            self.on_message_delta(event.data)
+        elif event.event == "thread.run.requires_action":
+            self.on_requires_action(event.data)
+        elif event.event.startswith("thread.run.step."):
+            self.on_run_step(event.event, event.data)
+        elif event.event.startswith("thread.run."):
+            self.on_run(event.event, event.data)
+        elif event.event in ("thread.message.created", "thread.message.completed"):
+            self.on_message(event.event, event.data)
+
+    # MARK - Run events
+
+    def on_run(self, name: str, run: Run) -> None:
+        log(lambda: f"\nassistant {name} > {run.status}")
+        self.run = run
+
+    def on_requires_action(self, run: Run) -> None:
+        """Fired when the run is waiting on the outputs of its tool calls."""
+
+        self.run = run
+        self.tool_calls = run.required_action.submit_tool_outputs.tool_calls
+        log(lambda: f"\nassistant requires_action > {[t.function.name for t in self.tool_calls]}")
+
+    def on_run_step(self, name: str, run_step: RunStep) -> None:
+        log(lambda: f"\nassistant {name} > {run_step.id}")
+
+    # MARK - Message and text events
 
-    @override
-    def on_message_done(self, message: Message) -> None:
-        log(lambda: f"\nassistant on_message_done > {message}\n")
-        return super().on_message_done(message)
+    def on_message_delta(self, delta: MessageDeltaEvent) -> None:
+        for content in delta.delta.content or []:
+            if content.type == "text" and content.text and content.text.value:
+                if self.turn_started is not None:
+                    tracer.observe("time_to_first_token", time.perf_counter() - self.turn_started)
+                    self.turn_started = None
+                log(lambda: f"assistant text delta > {content.text.value!r}", sample=50)
+                self.on_text_changed(content.text.value)
+
+    def on_message(self, name: str, message: Message) -> None:
+        log(lambda: f"\nassistant {name} > {message.id}\n")
@@ -0,0 +1,236 @@
+import json, asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from openai import OpenAI
+from .agent import Agent
+from .dispatch import Dispatcher
+from .tracing import tracer
+from .utils import INFO, log
+
+# Largest request body read; a search request is a query and a thread id.
+MAX_BODY_BYTES = 64 * 1024
+
+__all__ = ["AgentService", "serve"]
+
+
+class Session:
+    """A class to represent one conversation hosted by the service."""
+
+    def __init__(self, agent: Agent):
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.queue: asyncio.Queue | None = None
+
+
+class AgentService:
+    """A class to host many concurrent conversations, keyed by thread id, in one asyncio process."""
+
+    def __init__(
+        self,
+        client: OpenAI,
+        dispatcher: Dispatcher = None,
+        max_concurrent_turns: int = 16,
+        max_sessions: int = 1_000,
+        max_tool_concurrency: int = 4,
+        mode: str = None,
+    ):
+        self.client = client
+        self.dispatcher = dispatcher or Dispatcher()
+        # /stats reports how much projection saves
+        self.dispatcher.projector.measure = True
+        self.mode = Agent.resolve_mode(mode)
+        self.max_sessions = max_sessions
+        self.max_tool_concurrency = max_tool_concurrency
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self.active_turns = 0
+        self._turns = asyncio.Semaphore(max_concurrent_turns)
+        # Runs stream over the blocking OpenAI client, one worker thread per running turn
+        self._workers = ThreadPoolExecutor(max_concurrent_turns, thread_name_prefix="shoppy-turn")
+
+    async def search(self, query: str, thread_id: str = None) -> AsyncIterator[dict]:
+        """Runs one turn of the conversation and yields its events as they happen."""
+
+        loop = asyncio.get_running_loop()
+        session = await self._session(thread_id)
+        yield {"event": "thread", "data": session.agent.thread_id}
+
+        # One turn at a time per conversation, and at most `max_concurrent_turns` overall
+        async with session.lock, self._turns:
+            queue = asyncio.Queue()
+            session.queue = queue
+
+            def _run():
+                session.agent.search(query)
+
+            def _finish(future):
+                # A rolled over conversation carries on in its new thread
+                if session.agent.thread_id not in self.sessions:
+                    self.sessions[session.agent.thread_id] = session
+                    queue.put_nowait({"event": "thread", "data": session.agent.thread_id})
+
+                error = asyncio.CancelledError("The search was cancelled.") if future.cancelled() else future.exception()
+                event = {"event": "error", "data": str(error)} if error else None
+                queue.put_nowait(event or {"event": "done", "data": session.agent.runner.stats.model_dump()})
+                queue.put_nowait(None)
+
+            self.active_turns += 1
+            future = loop.run_in_executor(self._workers, _run)
+            future.add_done_callback(_finish)
+
+            try:
+                while (event := await queue.get()) is not None:
+                    yield event
+            finally:
+                # A disconnected client must not release the thread while its run is still going
+                session.queue = None
+                await asyncio.wait([future])
+                self.active_turns -= 1
+
+    def stats(self) -> dict:
+        """Returns the load of the service and its shared dispatcher."""
+
+        return {
+            "sessions": len(self.sessions),
+            "active_turns": self.active_turns,
+            "cache": self.dispatcher.cache.stats() if self.dispatcher.cache is not None else None,
+            "catalog": self.dispatcher.catalog.stats() if self.dispatcher.catalog is not None else None,
+            "coalesced": self.dispatcher.coalesced,
+            "duplicates_removed": self.dispatcher.duplicates_removed,
+            "local_filters": (
+                {"answered": self.dispatcher.local_filters.answered, "fallbacks": self.dispatcher.local_filters.fallbacks}
+                if self.dispatcher.local_filters is not None
+                else None
+            ),
+            "projection": self.dispatcher.projector.stats.model_dump(),
+        }
+
+    async def _session(self, thread_id: str = None) -> Session:
+        """Returns the session of the provided thread, creating the thread and session if needed."""
+
+        if thread_id in self.sessions:
+            self.sessions.move_to_end(thread_id)
+            return self.sessions[thread_id]
+
+        # Chat mode conversations live in the session; only Assistants API threads exist server-side
+        if not thread_id and self.mode == "assistants":
+            thread = await asyncio.to_thread(self.client.beta.threads.create)
+            thread_id = thread.id
+
+        loop = asyncio.get_running_loop()
+        session = None
+
+        # Agent callbacks fire on the worker thread; hand their events to the turn's queue
+        def _emit(event: str, data):
+            if session.queue is not None:
+                loop.call_soon_threadsafe(session.queue.put_nowait, {"event": event, "data": data})
+
+        agent = Agent(
+            self.client,
+            on_product_list=lambda products: _emit("products", products),
+            on_text_changed=lambda text: _emit("text", text),
+            thread_id=thread_id,
+            max_tool_concurrency=self.max_tool_concurrency,
+            dispatcher=self.dispatcher,
+            mode=self.mode,
+        )
+        session = Session(agent)
+        self.sessions[agent.thread_id] = session
+
+        # Forget the least recently used idle sessions; their threads live on server-side
+        for key in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if not self.sessions[key].lock.locked():
+                del self.sessions[key]
+
+        return session
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+async def serve(
+    service: AgentService, host: str = "127.0.0.1", port: int = 8080, max_body: int = MAX_BODY_BYTES
+) -> None:
+    """Serves the agent over HTTP: `POST /search` streams server-sent events, `GET /stats` reports load
+    and `GET /metrics` exposes the tracing histograms to Prometheus. Bodies over `max_body` bytes are refused."""
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode().split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if len(request_line) < 2:
+                return
+
+            method, path = request_line[0], request_line[1]
+
+            if method == "GET" and path == "/stats":
+                await _respond(writer, 200, json.dumps(service.stats()))
+                return
+
+            if method == "GET" and path == "/metrics":
+                await _respond(writer, 200, tracer.prometheus(), content_type="text/plain; version=0.0.4")
+                return
+
+            if method != "POST" or path != "/search":
+                await _respond(writer, 404, json.dumps({"error": "Not found"}))
+                return
+
+            length = headers.get("content-length", "0").strip()
+            if not length.isdigit():
+                await _respond(writer, 400, json.dumps({"error": "Invalid Content-Length"}))
+                return
+            if int(length) > max_body:
+                await _respond(writer, 413, json.dumps({"error": f"Request body over {max_body} bytes"}))
+                return
+
+            body = await reader.readexactly(int(length))
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                request = {}
+
+            query = request.get("query")
+            if not query:
+                await _respond(writer, 400, json.dumps({"error": "No query provided to search"}))
+                return
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            async for event in service.search(query, thread_id=request.get("thread_id")):
+                writer.write(f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n".encode())
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            log(lambda: f"Client disconnected: {error}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(_handle, host, port)
+    log(lambda: f"Serving on http://{host}:{port}", level=INFO)
+    async with server:
+        await server.serve_forever()
+
+
+async def _respond(
+    writer: asyncio.StreamWriter, status: int, body: str, content_type: str = "application/json"
+) -> None:
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}[status]
+    payload = body.encode()
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: close\r\n\r\n".encode()
+        + payload
+    )
+    await writer.drain()
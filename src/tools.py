@@ -30,7 +30,7 @@ def product_detailts():
             "properties": {
                 "serpapi_product_api": {
                     "type": "string",
-                    "description": "The serpapi product api link to get details for.",
+                    "description": "The serpapi product api link (or its link_ alias) to get details for.",
                 }
             },
             "additionalProperties": False,
@@ -49,7 +49,7 @@ def filter():
             "properties": {
                 "serpapi_link": {
                     "type": "string",
-                    "description": "The serpapi filter link to get results for.",
+                    "description": "The serpapi filter link (or its link_ alias) to get results for.",
                 }
             },
             "additionalProperties": False,
@@ -0,0 +1,178 @@
+import os, json, time, atexit, threading
+
+__all__ = ["Tracer", "tracer"]
+
+# Latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """A class to aggregate latencies into cumulative buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Span:
+    """A class to time an operation and record it as a histogram sample and a trace event."""
+
+    def __init__(self, tracer: "Tracer", name: str, labels: dict):
+        self.tracer = tracer
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def label(self, **labels) -> None:
+        """Adds labels that are only known once the operation is under way."""
+        self.labels.update(labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, *_):
+        if error_type is not None:
+            self.labels["error"] = error_type.__name__
+        self.tracer.record(self.name, time.perf_counter() - self.start, self.labels)
+
+
+class NoopSpan:
+    """A span that does nothing, used while tracing is disabled."""
+
+    def label(self, **labels) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_noop_span = NoopSpan()
+
+
+class Tracer:
+    """A class to collect spans, latency histograms and counters across the runner and dispatcher."""
+
+    def __init__(self, enabled: bool = False, trace_path: str = None):
+        self.enabled = enabled
+        self.histograms: dict[tuple, Histogram] = {}
+        self.counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._trace_file = open(trace_path, "a", buffering=64 * 1024) if trace_path else None
+        if self._trace_file:
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """Enables tracing when SHOPPY_TRACE is set, writing spans to that JSONL file unless it is just `1`.
+
+        SHOPPY_METRICS names a file the Prometheus text dump is written to when the process exits.
+        """
+
+        value = os.getenv("SHOPPY_TRACE")
+        if not value:
+            return cls()
+
+        tracer = cls(enabled=True, trace_path=None if value == "1" else value)
+
+        metrics_path = os.getenv("SHOPPY_METRICS")
+        if metrics_path:
+            atexit.register(tracer.dump, metrics_path)
+
+        return tracer
+
+    def span(self, name: str, **labels) -> Span | NoopSpan:
+        """Returns a context manager timing the enclosed operation."""
+        if not self.enabled:
+            return _noop_span
+        return Span(self, name, labels)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Records a latency measured elsewhere."""
+        if self.enabled:
+            self.record(name, seconds, labels)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Adds to a counter."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, name: str, seconds: float, labels: dict) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+            if self._trace_file:
+                event = {"name": name, "time": time.time(), "duration": seconds, "labels": labels}
+                self._trace_file.write(json.dumps(event, default=str) + "\n")
+
+    def prometheus(self) -> str:
+        """Returns every histogram and counter in the Prometheus text exposition format."""
+
+        def _labels(labels: tuple, extra: dict = None) -> str:
+            pairs = [*labels, *(extra or {}).items()]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.histograms}):
+                metric = f"shoppy_{name.replace('.', '_')}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for (key, labels), histogram in self.histograms.items():
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*BUCKETS, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{_labels(labels, {'le': bound})} {cumulative}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+
+            for name in sorted({name for name, _ in self.counters}):
+                metric = f"shoppy_{name.replace('.', '_')}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (key, labels), value in self.counters.items():
+                    if key == name:
+                        lines.append(f"{metric}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Writes the Prometheus text dump to the provided file."""
+        with open(path, "w") as file:
+            file.write(self.prometheus())
+
+    def close(self) -> None:
+        """Flushes and closes the trace file."""
+        with self._lock:
+            if self._trace_file:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+tracer = Tracer.from_env()
@@ -1,14 +1,155 @@
-import os, re
+import os, re, sys, queue, atexit, logging, logging.handlers
 
-__all__ = ["is_debug", "log", "remove_links"]
+__all__ = [
+    "is_debug",
+    "log",
+    "remove_links",
+    "configure_logging",
+    "truncate",
+    "DEBUG",
+    "INFO",
+    "WARNING",
+    "ERROR",
+]
 
 is_debug = os.getenv("ENV") != "production"
 
-# a logging method that only executes the message closure if it's debug mode
-def log(message_callable: callable):
-    if is_debug:
-        print(message_callable(), flush=True)
-    
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+
+# Loggers are named after their modules; these are the packages the levels apply to.
+PACKAGES = ("src", "cli", "scripts")
+
+
+class RingBufferHandler(logging.handlers.QueueHandler):
+    """A queue handler that drops the oldest records instead of blocking when the writer falls behind."""
+
+    def __init__(self, capacity: int):
+        super().__init__(queue.Queue(capacity))
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Messages are already formatted and truncated by log(); the writer thread does the rest
+        return record
+
+
+_floor = logging.CRITICAL + 1
+_max_bytes = 2_000
+_samples: dict[tuple, int] = {}
+_listener: logging.handlers.QueueListener | None = None
+
+
+def configure_logging(
+    level: int | str = None,
+    levels: dict[str, int | str] = None,
+    stream=None,
+    max_bytes: int = None,
+    capacity: int = 10_000,
+) -> None:
+    """Routes log() through a background writer thread.
+
+    Defaults come from the environment: LOG_LEVEL (DEBUG unless ENV is production),
+    LOG_LEVELS as `module=LEVEL,...` overrides, LOG_FILE instead of stdout, and
+    LOG_MAX_BYTES to cap each message.
+    """
+
+    global _floor, _max_bytes, _listener
+
+    level = level or os.getenv("LOG_LEVEL", "").upper() or ("DEBUG" if is_debug else "WARNING")
+    if levels is None:
+        levels = dict(
+            pair.split("=", 1) for pair in os.getenv("LOG_LEVELS", "").split(",") if "=" in pair
+        )
+    _max_bytes = max_bytes or int(os.getenv("LOG_MAX_BYTES", 2_000))
+
+    if _listener is not None:
+        _listener.stop()
+
+    if stream is None:
+        path = os.getenv("LOG_FILE")
+        stream = open(path, "a") if path else sys.stdout
+
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(logging.Formatter("%(message)s"))
+    handler = RingBufferHandler(capacity)
+    _listener = logging.handlers.QueueListener(handler.queue, writer)
+
+    for package in PACKAGES:
+        logger = logging.getLogger(package)
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(level)
+
+    for name, module_level in levels.items():
+        if isinstance(module_level, str):
+            module_level = module_level.strip().upper()
+        logging.getLogger(name.strip()).setLevel(module_level)
+
+    # The cheapest check in log(): nothing below the lowest configured level is ever logged
+    names = (*PACKAGES, *[name.strip() for name in levels])
+    _floor = min(logging.getLogger(name).getEffectiveLevel() for name in names)
+    _listener.start()
+
+
+def log(message_callable: callable, level: int = DEBUG, sample: int = 1):
+    """Logs the message returned by the closure, which is only called when the caller's level is enabled.
+
+    With `sample` set to N, only one of every N calls from the same line is logged.
+    """
+
+    if level < _floor:
+        return
+
+    frame = sys._getframe(1)
+    logger = logging.getLogger(frame.f_globals.get("__name__", "src"))
+    if not logger.isEnabledFor(level):
+        return
+
+    if sample > 1:
+        site = (frame.f_code, frame.f_lineno)
+        count = _samples.get(site, 0)
+        _samples[site] = count + 1
+        if count % sample:
+            return
+
+    logger.log(level, truncate(str(message_callable())))
+
+
+def truncate(text: str, max_bytes: int = None) -> str:
+    """Returns the text cut to at most `max_bytes` bytes of UTF-8."""
+
+    max_bytes = max_bytes or _max_bytes
+    if len(text) * 4 <= max_bytes:
+        return text
+
+    encoded = text.encode()
+    if len(encoded) <= max_bytes:
+        return text
+
+    return encoded[:max_bytes].decode(errors="ignore") + f"... ({len(encoded) - max_bytes} more bytes)"
+
+
+def _shutdown():
+    # Flush the records still queued
+    if _listener is not None:
+        _listener.stop()
+
+
 def remove_links(input):
     url_pattern = re.compile(r'https?://\S+|www\.\S+')
-    return re.sub(url_pattern, '<LINK>', input)
\ No newline at end of file
+    return re.sub(url_pattern, '<LINK>', input)
+
+
+configure_logging()
+atexit.register(_shutdown)